@@ -2,31 +2,38 @@
 
 import streamlit as st
 import pandas as pd
-import io
+import functools
+import uuid
 from datetime import datetime, date
 from pathlib import Path
 
-from products import PRODUCTS, WATER_LOT_PATTERNS, RECIPIENTS, STAFF_LIST, SALES_AREAS
-
-# CSV出力用の商品リスト（short_name順）
-CSV_PRODUCT_ORDER = [
-    "香るトリュフ",
-    "焦がしガーリック",
-    "和紅茶サブレ",
-    "ガトーショコラサブレ",
-    "濃厚ショコラおかき",
-    "濃厚ショコララスク",
-    "2Gummy",
-    "2Energy",
-    "2Energy(26RN)",
-    "2Water",
-]
-from database import save_quote, get_all_quotes, delete_quote, search_quotes
-from pdf_generator import generate_pdf, get_pdf_filename
+from master_data import get_master_data, get_master_data_loader
+from price_book import NO_LOT
+from database import (
+    get_all_quotes, delete_quote,
+    search_quote_summaries, count_quotes, get_quote_by_id, iter_quote_items_for_export,
+    get_query_cache, get_quote_pdf, attach_quote_pdf, DEFAULT_PAGE_SIZE,
+    search_quote_ids, iter_quotes_with_pdf,
+)
+from csv_export import get_csv_export_cache
+from batch_pdf import write_quotes_pdf_zip, MAX_ZIP_BYTES
+from artifact_store import get_artifact_store
+from image_cache import get_ui_thumbnail
+from jobs import submit_quote_job, JobLimitError
+from pdf_generator import (
+    generate_pdf, get_pdf_filename, get_pdf_inputs, get_quote_hash, get_pdf_memo, start_warmup,
+    get_font_load_stats,
+)
 
 # 画像フォルダのパス（Streamlit Cloud対応）
 IMAGE_FOLDER = Path(__file__).parent / "images"
 
+# 商品画像は表示幅に縮小した画像（256色の PNG）を表示する（False で元画像を表示）
+USE_UI_THUMBNAILS = True
+
+# 見積書作成ジョブの進捗を確認する間隔（秒）
+JOB_POLL_INTERVAL = 0.5
+
 # ページ設定
 st.set_page_config(
     page_title="2foods 見積書作成アプリ",
@@ -70,6 +77,12 @@ st.markdown("""
 def main():
     """メイン関数"""
 
+    # PDF生成の準備（フォント登録など）をバックグラウンドで開始（初回のみ）
+    start_warmup()
+
+    # マスタデータ（ファイルが更新されていれば読み込み直す）。1回の表示ではこの一式だけを使う
+    master = get_master_data()
+
     # サイドバー：ナビゲーション
     st.sidebar.title("メニュー")
     page = st.sidebar.radio(
@@ -78,15 +91,19 @@ def main():
         label_visibility="collapsed"
     )
 
+    master_error = get_master_data_loader().error
+    if master_error:
+        st.sidebar.warning(f"マスタファイルを読み込めないため、前回のデータを使用しています: {master_error}")
+
     if page == "見積書作成":
-        show_quote_form()
+        show_quote_form(master)
     elif page == "見積履歴":
-        show_quote_history()
+        show_quote_history(master)
     else:
-        show_product_master()
+        show_product_master(master)
 
 
-def show_quote_form():
+def show_quote_form(master):
     """見積書作成フォーム"""
 
     st.markdown('<h1 class="main-header">2foods 見積書作成アプリ</h1>', unsafe_allow_html=True)
@@ -98,7 +115,7 @@ def show_quote_form():
 
     with col1:
         # 送付先
-        recipient_options = ["-- 選択 --"] + RECIPIENTS + ["その他（直接入力）"]
+        recipient_options = ["-- 選択 --", *master.recipients, "その他（直接入力）"]
         recipient_select = st.selectbox("送付先（企業名）", recipient_options)
 
         if recipient_select == "その他（直接入力）":
@@ -114,7 +131,7 @@ def show_quote_form():
 
     with col2:
         # 担当者
-        staff = st.selectbox("担当者", STAFF_LIST)
+        staff = st.selectbox("担当者", master.staff_list)
 
         # 日付
         quote_date = st.date_input("日付", value=date.today())
@@ -122,8 +139,8 @@ def show_quote_form():
         # 販売エリア
         sales_area_options = st.multiselect(
             "販売エリア（複数選択可）",
-            SALES_AREAS,
-            default=["全国"]
+            master.sales_areas,
+            default=["全国"] if "全国" in master.sales_areas else None
         )
         # 「全国」が含まれている場合は全国のみ
         if "全国" in sales_area_options:
@@ -141,19 +158,27 @@ def show_quote_form():
         st.session_state.selected_products = {}
     if 'water_selections' not in st.session_state:
         st.session_state.water_selections = {}
+    if st.session_state.get('master_version') != master.version:
+        refresh_selections(master)
 
     # 商品をグリッド表示
     cols = st.columns(3)
 
-    for idx, product in enumerate(PRODUCTS):
+    # 標準卸価格は見積の日付時点の価格表の価格
+    price_book = master.price_book
+
+    for idx, product in enumerate(master.catalog):
         col_idx = idx % 3
 
         with cols[col_idx]:
             # 2Water専用の処理
-            if product.get('is_water'):
-                render_water_product(product)
+            if product.is_water:
+                standard_prices = price_book.prices_as_of(
+                    (product.jan, lot['lot'], quote_date) for lot in master.water_lot_patterns
+                )
+                render_water_product(product, master.water_lot_patterns, standard_prices)
             else:
-                render_normal_product(product, idx)
+                render_normal_product(product, price_book.price_as_of(product.jan, NO_LOT, quote_date))
 
     st.divider()
 
@@ -191,30 +216,29 @@ def show_quote_form():
     # === 確認・生成 ===
     st.subheader("✅ 確認・生成")
 
-    # 選択された商品を収集
-    selected_products = collect_selected_products()
+    # プレビュー表示（カードの価格・特別条件の変更では画面全体を再描画しないため、フラグメントで更新する）
+    show_quote_preview(master.price_book, quote_date)
 
-    # プレビュー表示
-    if selected_products:
-        st.write(f"**選択商品数**: {len(selected_products)}件")
-        preview_df = pd.DataFrame([
-            {
-                "商品名": p['name'],
-                "卸価格": f"{p['wholesale_price']}円",
-                "特別条件": p.get('special_condition', '-')
-            }
-            for p in selected_products
-        ])
-        st.dataframe(preview_df, hide_index=True, use_container_width=True)
+    # 作成中のジョブが終わっていれば結果を受け取る
+    job = st.session_state.get('quote_job')
+    if job is not None and job.done:
+        collect_quote_job(job)
+        st.session_state.quote_job = job = None
 
     # ボタン
     col1, col2, col3 = st.columns([1, 1, 2])
 
     with col1:
-        create_btn = st.button("📄 見積書を作成", type="primary", use_container_width=True)
+        create_btn = st.button(
+            "📄 見積書を作成", type="primary", use_container_width=True,
+            disabled=job is not None and not job.done,
+        )
 
     # 見積書作成処理
     if create_btn:
+        # 見積に含める商品は、作成時点のセッション状態から集める
+        selected_products = collect_selected_products()
+
         # バリデーション
         if not recipient:
             st.error("送付先を入力してください")
@@ -226,49 +250,52 @@ def show_quote_form():
             st.error("販売エリアを選択してください")
             st.stop()
 
-        # PDF生成
+        # PDF生成と履歴保存をバックグラウンドで開始（完了は show_quote_job_progress で確認）
         try:
-            pdf_data = generate_pdf(
-                recipient=recipient,
-                retailer=retailer,
-                show_retailer=show_retailer,
-                staff=staff,
-                quote_date=str(quote_date),
-                sales_area=sales_area,
-                products=selected_products,
-                notes=notes
-            )
-
-            # データベースに保存
-            quote_id = save_quote(
-                quote_date=str(quote_date),
-                recipient=recipient,
-                retailer=retailer,
-                staff=staff,
-                sales_area=sales_area,
-                products=selected_products,
-                notes=notes
-            )
-
-            # セッションに保存
-            st.session_state.pdf_data = pdf_data
-            st.session_state.pdf_filename = get_pdf_filename(recipient, str(quote_date))
-            st.session_state.last_quote_id = quote_id
-
-            st.rerun()  # 画面を再描画してダウンロードボタンを表示
-
+            pdf_inputs = {
+                'recipient': recipient,
+                'retailer': retailer,
+                'show_retailer': show_retailer,
+                'staff': staff,
+                'quote_date': str(quote_date),
+                'sales_area': sales_area,
+                'products': selected_products,
+                'notes': notes,
+            }
+            pdf_filename = get_pdf_filename(recipient, str(quote_date))
+            job = submit_quote_job(get_session_key(), pdf_inputs, pdf_filename)
+            st.session_state.quote_job = job
+
+            # 前回作成したPDFのダウンロードボタンは消す
+            clear_quote_pdf()
+            st.session_state.last_quote_id = None
+            st.session_state.quote_job_error = None
+            st.session_state.quote_job_warning = None
+
+        except JobLimitError as e:
+            st.warning(str(e))
         except Exception as e:
             st.error(f"エラーが発生しました: {str(e)}")
 
+    # 作成中は進捗を表示（完了したら画面全体を再描画してダウンロードボタンを表示）
+    if job is not None:
+        show_quote_job_progress()
+
     # PDFダウンロードボタン（作成後に表示）
-    if 'pdf_data' in st.session_state and st.session_state.pdf_data:
+    if st.session_state.get('pdf_handle'):
         st.success(f"見積書を作成しました！（履歴ID: {st.session_state.get('last_quote_id', '-')}）")
+        if st.session_state.get('quote_job_warning'):
+            st.warning(st.session_state.quote_job_warning)
 
         col1, col2, col3 = st.columns([1, 1, 2])
         with col1:
+            # PDFは生成物ストアに置き、クリックされたときに取り出す（期限切れなら保存済みPDFを使用）
             st.download_button(
                 label="⬇️ PDFダウンロード",
-                data=st.session_state.pdf_data,
+                data=functools.partial(
+                    load_artifact, st.session_state.pdf_handle,
+                    functools.partial(get_quote_pdf, st.session_state.last_quote_id),
+                ),
                 file_name=st.session_state.pdf_filename,
                 mime="application/pdf",
                 use_container_width=True,
@@ -276,51 +303,155 @@ def show_quote_form():
             )
         with col2:
             if st.button("🔄 新規作成", use_container_width=True):
-                st.session_state.pdf_data = None
-                st.session_state.pdf_filename = None
+                clear_quote_pdf()
                 st.session_state.last_quote_id = None
+                st.session_state.quote_job_warning = None
                 st.rerun()
+    elif st.session_state.get('quote_job_error'):
+        st.error(f"エラーが発生しました: {st.session_state.quote_job_error}")
+
+
+def get_session_key():
+    """セッションを区別するキー（ジョブの同時実行数をセッションごとに制限するため）"""
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    return st.session_state.session_key
+
+
+def load_artifact(handle, fallback=None):
+    """生成物ストアからデータを取得（破棄済みの場合は fallback() の戻り値）"""
+    data = get_artifact_store().get(handle)
+    if data is None and fallback is not None:
+        data = fallback()
+    return data
+
+
+def clear_quote_pdf():
+    """作成したPDFをセッションから外して生成物ストアからも破棄"""
+    get_artifact_store().discard(st.session_state.get('pdf_handle'))
+    st.session_state.pdf_handle = None
+    st.session_state.pdf_filename = None
+
+
+def collect_quote_job(job):
+    """完了したジョブの結果をセッションに保存（PDFは生成物ストアに置いてハンドルだけ持つ）"""
+    st.session_state.quote_job_error = job.error
+    st.session_state.quote_job_warning = job.warning
+    if job.succeeded:
+        clear_quote_pdf()
+        st.session_state.pdf_handle = get_artifact_store().put(job.pdf_data)
+        st.session_state.pdf_filename = job.pdf_filename
+        st.session_state.last_quote_id = job.quote_id
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def show_quote_job_progress():
+    """見積書作成ジョブの進捗表示（一定間隔でこの部分だけ再描画）"""
+    job = st.session_state.get('quote_job')
+    if job is None:
+        return
+    if job.done:
+        st.rerun()  # 画面全体を再描画して結果を表示
+
+    st.progress(job.progress, text=f"作成中: {job.current_step}（{job.elapsed:.1f}秒）")
+
+
+def show_product_image(product, width, missing):
+    """商品画像を表示（表示幅に合わせた縮小画像を使い、画像がない場合は missing を表示）"""
+    image_filename = product.image
+    image_path = IMAGE_FOLDER / image_filename
+    if not image_filename or not image_path.exists():
+        st.write(missing)
+        return
+
+    if USE_UI_THUMBNAILS:
+        # 表示幅の PNG は st.image で変換されず、そのまま /media の URL で配信される
+        st.image(str(get_ui_thumbnail(image_filename, width) or image_path), width=width, output_format="PNG")
+    else:
+        st.image(str(image_path), width=width)
+
+
+def _selection_toggled(previous, current):
+    """選択有無が切り替わったか（価格・特別条件の変更は含まない）"""
+    if previous is None:
+        return False  # 初回表示
+    return bool(previous.get('selected')) != bool(current['selected'])
+
+
+def refresh_selections(master):
+    """マスタデータが読み込み直されたとき、選択中の商品を新しい商品マスタに合わせる
+
+    選択は JAN・ロット名で保持しているため、並び順が変わっても別の商品に移らない。
+    商品マスタから削除された商品・ロットの選択は外す。
+    """
+    selected_products = {}
+    for jan, data in st.session_state.selected_products.items():
+        product = master.catalog.by_jan(jan)
+        if product is not None and not product.is_water:
+            selected_products[jan] = dict(data, product=product)
+    st.session_state.selected_products = selected_products
+
+    water_product = master.water_product
+    lots = {lot['lot'] for lot in master.water_lot_patterns}
+    st.session_state.water_selections = {
+        lot: dict(data, product=water_product)
+        for lot, data in st.session_state.water_selections.items()
+        if water_product is not None and lot in lots
+    }
+    st.session_state.master_version = master.version
+
+
+def format_standard_price(standard_price, wholesale_price):
+    """標準卸価格と、入力した卸価格との差の表示"""
+    if standard_price is None:
+        return "標準卸価格: -"
+    difference = wholesale_price - standard_price
+    if difference == 0:
+        return f"標準卸価格: ¥{standard_price}"
+    return f"標準卸価格: ¥{standard_price}（{difference:+d}円）"
+
 
+@st.fragment
+def render_normal_product(product, standard_price):
+    """通常商品のカード表示
 
-def render_normal_product(product, idx):
-    """通常商品のカード表示"""
+    フラグメントとして表示するため、カード内の入力ではこのカードだけが再描画される。
+    選択有無を切り替えたときだけ、選択商品数とプレビューを更新するため画面全体を再描画する。
+    """
 
-    key_prefix = f"product_{idx}"
-    is_selected = st.session_state.selected_products.get(idx, {}).get('selected', False)
+    key_prefix = f"product_{product.jan}"
+    is_selected = st.session_state.selected_products.get(product.jan, {}).get('selected', False)
 
     with st.container():
         # 画像と商品情報を横並び
         img_col, info_col = st.columns([1, 3])
 
         with img_col:
-            # 商品画像を表示
-            image_path = IMAGE_FOLDER / product.get('image', '')
-            if image_path.exists():
-                st.image(str(image_path), width=80)
-            else:
-                st.write("📦")  # 画像がない場合はアイコン
+            # 商品画像を表示（画像がない場合はアイコン）
+            show_product_image(product, width=80, missing="📦")
 
         with info_col:
             # チェックボックスと商品名
             selected = st.checkbox(
-                f"**{product['name']}**",
+                f"**{product.name}**",
                 value=is_selected,
                 key=f"{key_prefix}_check"
             )
 
             # 商品詳細
-            st.caption(f"JAN: {product['jan']} | 容量: {product['volume']} | ケース入数: {product['case_qty']}")
-            st.caption(f"想定小売: ¥{product['retail_price']} | 賞味期限: D{product['shelf_life']}")
+            st.caption(f"JAN: {product.jan} | 容量: {product.volume} | ケース入数: {product.case_qty}")
+            st.caption(f"想定小売: ¥{product.retail_price} | 賞味期限: D{product.shelf_life}")
 
         # 仕切価格と特別条件
         col1, col2 = st.columns(2)
         with col1:
             wholesale_price = st.number_input(
                 "卸価格（円）",
-                value=product['wholesale_price'],
+                value=product.wholesale_price,
                 min_value=0,
                 key=f"{key_prefix}_price"
             )
+            st.caption(format_standard_price(standard_price, wholesale_price))
         with col2:
             special_condition = st.text_input(
                 "特別条件",
@@ -329,38 +460,41 @@ def render_normal_product(product, idx):
             )
 
         # セッション状態を更新
-        st.session_state.selected_products[idx] = {
+        previous = st.session_state.selected_products.get(product.jan)
+        current = {
             'selected': selected,
             'product': product,
             'wholesale_price': wholesale_price,
             'special_condition': special_condition
         }
+        st.session_state.selected_products[product.jan] = current
 
         st.markdown("---")
 
+    if _selection_toggled(previous, current):
+        st.rerun()
+
 
-def render_water_product(product):
-    """2Water専用のカード表示"""
+@st.fragment
+def render_water_product(product, lot_patterns, standard_prices):
+    """2Water専用のカード表示（ロット別価格の入力欄ごとフラグメントとして再描画）"""
 
     # 画像と商品情報を横並び
     img_col, info_col = st.columns([1, 3])
 
     with img_col:
-        image_path = IMAGE_FOLDER / product.get('image', '')
-        if image_path.exists():
-            st.image(str(image_path), width=80)
-        else:
-            st.write("📦")
+        show_product_image(product, width=80, missing="📦")
 
     with info_col:
-        st.markdown(f"**{product['name']}**")
-        st.caption(f"JAN: {product['jan']} | 容量: {product['volume']} | ケース入数: {product['case_qty']}")
-        st.caption(f"想定小売: ¥{product['retail_price']} | 賞味期限: D{product['shelf_life']}")
+        st.markdown(f"**{product.name}**")
+        st.caption(f"JAN: {product.jan} | 容量: {product.volume} | ケース入数: {product.case_qty}")
+        st.caption(f"想定小売: ¥{product.retail_price} | 賞味期限: D{product.shelf_life}")
 
     st.write("**ロット別価格設定:**")
 
-    for i, lot in enumerate(WATER_LOT_PATTERNS):
-        key_prefix = f"water_{i}"
+    changed = False
+    for lot, standard_price in zip(lot_patterns, standard_prices):
+        key_prefix = f"water_{lot['lot']}"
         col1, col2, col3 = st.columns([2, 2, 2])
 
         with col1:
@@ -376,6 +510,7 @@ def render_water_product(product):
                 key=f"{key_prefix}_price",
                 label_visibility="collapsed"
             )
+            st.caption(format_standard_price(standard_price, price))
         with col3:
             special = st.text_input(
                 "特別条件",
@@ -385,16 +520,51 @@ def render_water_product(product):
             )
 
         # セッション状態を更新
-        st.session_state.water_selections[i] = {
+        previous = st.session_state.water_selections.get(lot['lot'])
+        current = {
             'selected': selected,
             'lot': lot['lot'],
             'product': product,
             'wholesale_price': price,
             'special_condition': special
         }
+        st.session_state.water_selections[lot['lot']] = current
+        changed = changed or _selection_toggled(previous, current)
 
     st.markdown("---")
 
+    if changed:
+        st.rerun()
+
+
+@st.fragment
+def show_quote_preview(price_book, quote_date):
+    """選択商品のプレビュー
+
+    カードの価格・特別条件の変更は画面全体を再描画しないため、「プレビューを更新」でこの部分だけ読み直す。
+    """
+    selected_products = collect_selected_products()
+    if not selected_products:
+        return
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.write(f"**選択商品数**: {len(selected_products)}件")
+    with col2:
+        st.button("🔄 プレビューを更新", key="refresh_preview", use_container_width=True)
+
+    standard_prices = price_book.standard_prices(selected_products, quote_date)
+    preview_df = pd.DataFrame([
+        {
+            "商品名": p['name'],
+            "標準卸価格": "-" if standard_price is None else f"{standard_price}円",
+            "卸価格": f"{p['wholesale_price']}円",
+            "特別条件": p.get('special_condition', '-')
+        }
+        for p, standard_price in zip(selected_products, standard_prices)
+    ])
+    st.dataframe(preview_df, hide_index=True, use_container_width=True)
+
 
 def collect_selected_products():
     """選択された商品を収集"""
@@ -402,102 +572,80 @@ def collect_selected_products():
     selected = []
 
     # 通常商品
-    for idx, data in st.session_state.selected_products.items():
+    for data in st.session_state.selected_products.values():
         if data.get('selected'):
-            product = data['product'].copy()
-            product['wholesale_price'] = data['wholesale_price']
-            product['special_condition'] = data.get('special_condition', '')
-            selected.append(product)
+            selected.append(data['product'].to_quote_item(
+                data['wholesale_price'], data.get('special_condition', ''),
+            ))
 
     # 2Water
-    for i, data in st.session_state.water_selections.items():
+    for data in st.session_state.water_selections.values():
         if data.get('selected'):
-            product = data['product'].copy()
-            product['order_lot'] = data['lot']
-            product['wholesale_price'] = data['wholesale_price']
-            product['special_condition'] = data.get('special_condition', '')
-            selected.append(product)
+            selected.append(data['product'].to_quote_item(
+                data['wholesale_price'], data.get('special_condition', ''), order_lot=data['lot'],
+            ))
 
     return selected
 
 
-def generate_quotes_csv(quotes):
-    """見積履歴をCSV形式で生成"""
-    # ヘッダー行を作成
-    headers = ["対象小売", "送付先", "日付", "担当者"]
-    for product_name in CSV_PRODUCT_ORDER:
-        headers.append(product_name)
-        headers.append("特別条件")
-
-    # データ行を作成
-    rows = []
-    for quote in quotes:
-        row = [
-            quote.get('retailer', ''),
-            quote.get('recipient', ''),
-            quote.get('quote_date', ''),
-            quote.get('staff', ''),
-        ]
-
-        # 見積に含まれる商品をマッピング
-        quote_products = {}
-        water_items = []  # 2Water用（複数ロット対応）
-
-        for p in quote.get('products', []):
-            short_name = p.get('short_name', '')
-
-            # 2Waterは複数ロット選択の可能性があるので別処理
-            if short_name == '2Water':
-                lot = p.get('order_lot', '')
-                # ロット名を短縮（例: "10ケース" → "10cs"）
-                lot_short = lot.replace('ケース', 'cs').replace('（パレット）', '')
-                water_items.append({
-                    'lot': lot_short,
-                    'price': p.get('wholesale_price', ''),
-                    'special': p.get('special_condition', '')
-                })
-            else:
-                quote_products[short_name] = {
-                    'price': p.get('wholesale_price', ''),
-                    'special': p.get('special_condition', '')
-                }
-
-        # 2Waterを結合形式でまとめる
-        if water_items:
-            price_parts = []
-            special_parts = []
-            for item in water_items:
-                price_parts.append(f"{item['lot']}:{item['price']}円")
-                if item['special']:
-                    special_parts.append(f"{item['lot']}:{item['special']}円")
-            quote_products['2Water'] = {
-                'price': ', '.join(price_parts),
-                'special': ', '.join(special_parts) if special_parts else ''
-            }
+def export_quotes_csv(search_params):
+    """検索条件に一致する見積をCSVに書き出す（ダウンロードボタン押下時に実行）
 
-        # 各商品の価格と特別条件を追加
-        for product_name in CSV_PRODUCT_ORDER:
-            if product_name in quote_products:
-                row.append(quote_products[product_name]['price'])
-                row.append(quote_products[product_name]['special'])
-            else:
-                row.append('')
-                row.append('')
+    サーバーサイドカーソルで明細を少しずつ読み、まとめて横持ちに振り分けながら生成物ストアのファイルへ書き出すため、
+    件数が増えても作成中のメモリ使用量は一定（ダウンロードの間は Streamlit がCSV全体をメモリに持つ）。
+    作成したCSVは検索条件ごとに保持し、見積が保存・削除されるか商品マスタが読み込み直されるまで再利用する。
+    """
+    return get_csv_export_cache().get_or_build(
+        (tuple(search_params.items()), get_master_data().version),
+        get_query_cache().generation,
+        functools.partial(iter_quote_items_for_export, **search_params),
+    )
 
-        rows.append(row)
 
-    # DataFrameを作成してCSV出力
-    df = pd.DataFrame(rows, columns=headers)
+def load_quote_pdf(quote):
+    """履歴の見積PDFを取得（保存済みPDFがない過去の見積は再生成して保存）"""
+    pdf_data = get_quote_pdf(quote['id'])
+    if pdf_data is not None:
+        return pdf_data
 
-    # CSVをバイト列として出力（BOM付きUTF-8でExcel対応）
-    output = io.BytesIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')
-    output.seek(0)
+    pdf_inputs = get_pdf_inputs(quote)
+    pdf_data = generate_pdf(**pdf_inputs)
+    attach_quote_pdf(
+        quote['id'],
+        get_quote_hash(**pdf_inputs),
+        pdf_data,
+        pdf_filename=get_pdf_filename(quote['recipient'], quote['quote_date'])
+    )
+    return pdf_data
 
-    return output.getvalue()
 
+def export_quotes_pdf_zip(search_params, progress_bar):
+    """検索条件に一致する見積のPDFを一括生成してZIPにまとめる
 
-def show_quote_history():
+    保存済みPDFはそのまま使い、ないものは複数プロセスで並列に生成して保存する。
+    ZIPは生成物ストアのファイルに直接書き出し、メモリには読み込まない（ダウンロード時に読み込む）。
+    PDFの合計はストアのディスクの上限までに抑える。
+    戻り値: (生成物ストアのハンドル（保持できなかった場合は None）, BatchResult)
+    """
+    quote_ids = search_quote_ids(**search_params)
+
+    def on_progress(completed, total):
+        progress_bar.progress(completed / total, text=f"PDF作成中... {completed} / {total}件")
+
+    def on_rendered(quote_id, pdf_hash, pdf_data, filename):
+        attach_quote_pdf(quote_id, pdf_hash, pdf_data, pdf_filename=filename)
+
+    store = get_artifact_store()
+    return store.put_stream(
+        lambda output: write_quotes_pdf_zip(
+            iter_quotes_with_pdf(quote_ids), output, len(quote_ids),
+            on_progress=on_progress, on_rendered=on_rendered,
+            max_bytes=min(MAX_ZIP_BYTES, store.disk_limit),
+        )
+    )
+
+
+def show_quote_history(master):
     """見積履歴ページ"""
 
     st.markdown('<h1 class="main-header">見積履歴</h1>', unsafe_allow_html=True)
@@ -508,7 +656,7 @@ def show_quote_history():
     with col1:
         search_keyword = st.text_input("検索（送付先・対象小売）", placeholder="キーワード入力")
     with col2:
-        filter_staff = st.selectbox("担当者フィルター", ["すべて"] + STAFF_LIST)
+        filter_staff = st.selectbox("担当者フィルター", ["すべて", *master.staff_list])
     with col3:
         date_range = st.date_input(
             "日付範囲",
@@ -526,39 +674,104 @@ def show_quote_history():
     staff_filter = filter_staff if filter_staff != "すべて" else None
     keyword_filter = search_keyword if search_keyword else None
 
-    quotes = search_quotes(
-        keyword=keyword_filter,
-        start_date=start_date,
-        end_date=end_date,
-        staff=staff_filter
-    )
+    search_params = {
+        'keyword': keyword_filter,
+        'start_date': start_date,
+        'end_date': end_date,
+        'staff': staff_filter,
+    }
+
+    # 検索条件が変わったら1ページ目に戻す
+    search_signature = tuple(search_params.values())
+    if st.session_state.get('history_search_signature') != search_signature:
+        st.session_state.history_search_signature = search_signature
+        st.session_state.history_page_cursors = [None]  # 各ページの開始カーソル
+
+    page_cursors = st.session_state.history_page_cursors
+    page_number = len(page_cursors)
+
+    total_count = count_quotes(**search_params)
+    summaries, next_cursor = search_quote_summaries(cursor=page_cursors[-1], **search_params)
+
+    # 削除などでページが空になった場合は前のページに戻る
+    if not summaries and page_number > 1:
+        page_cursors.pop()
+        st.rerun()
 
     # 履歴表示
-    col_result, col_csv = st.columns([3, 1])
+    col_result, col_zip, col_csv = st.columns([2, 1, 1])
     with col_result:
-        st.write(f"**検索結果**: {len(quotes)}件")
+        st.write(f"**検索結果**: {total_count}件")
+    with col_zip:
+        if total_count and st.button("📦 PDF一括作成（ZIP）", use_container_width=True):
+            progress_bar = st.progress(0.0, text="PDF作成中...")
+            zip_handle, result = export_quotes_pdf_zip(search_params, progress_bar)
+            progress_bar.empty()
+
+            # ZIPは生成物ストアに置き、セッションにはハンドルだけ持たせる
+            previous = st.session_state.get('history_pdf_zip')
+            if previous:
+                get_artifact_store().discard(previous[1])
+            st.session_state.history_pdf_zip = (search_signature, zip_handle, result)
+
+        pdf_zip = st.session_state.get('history_pdf_zip')
+        if pdf_zip and pdf_zip[0] == search_signature:
+            _, zip_handle, result = pdf_zip
+            if result.files and zip_handle is None:
+                st.caption("ZIPが保存できる大きさを超えました。検索条件を絞り込んで作成し直してください")
+            elif result.files and not get_artifact_store().contains(zip_handle):
+                st.caption("ZIPの保存期限が過ぎました。もう一度作成してください")
+            elif result.files:
+                today_str = datetime.now().strftime("%Y%m%d")
+                st.download_button(
+                    label=f"⬇️ ZIPダウンロード（{len(result.files)}件）",
+                    data=functools.partial(load_artifact, zip_handle),
+                    file_name=f"見積書PDF_{today_str}.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
+            if result.failures:
+                st.warning(f"{len(result.failures)}件のPDFを作成できませんでした")
+                for quote_id, filename, message in result.failures:
+                    st.caption(f"・ID {quote_id} {filename}: {message}")
+            if result.truncated:
+                st.caption("ZIPのサイズ上限に達したため、検索条件を絞り込んで作成し直してください")
+            if result.save_errors:
+                st.warning(f"{len(result.save_errors)}件のPDFを保存できませんでした（ZIPには含めています）")
+                for quote_id, filename, message in result.save_errors:
+                    st.caption(f"・ID {quote_id} {filename}: {message}")
     with col_csv:
-        if quotes:
-            csv_data = generate_quotes_csv(quotes)
+        if total_count:
             today_str = datetime.now().strftime("%Y%m%d")
             st.download_button(
                 label="📥 CSVダウンロード",
-                data=csv_data,
+                data=functools.partial(export_quotes_csv, search_params),
                 file_name=f"見積履歴_{today_str}.csv",
                 mime="text/csv",
                 use_container_width=True
             )
 
-    if not quotes:
+    if not summaries:
         st.info("履歴がありません")
         return
 
     # テーブル形式で表示
-    for quote in quotes:
-        with st.expander(
-            f"📄 {quote['quote_date']} | {quote['recipient']} | {quote.get('retailer', '-')} | {quote['staff']}",
-            expanded=False
-        ):
+    for summary in summaries:
+        expander = st.expander(
+            f"📄 {summary['quote_date']} | {summary['recipient']} | {summary.get('retailer', '-')} | {summary['staff']}",
+            expanded=False,
+            key=f"quote_{summary['id']}",
+            on_change="rerun"
+        )
+        with expander:
+            # 開いている見積だけ詳細を取得
+            if not expander.open:
+                continue
+            quote = get_quote_by_id(summary['id'])
+            if quote is None:
+                st.warning("この見積は削除されています")
+                continue
+
             col1, col2 = st.columns([3, 1])
 
             with col1:
@@ -572,27 +785,22 @@ def show_quote_history():
                 st.write("**商品:**")
                 products = quote.get('products', [])
                 if products:
-                    for p in products:
+                    # 見積の日付時点の標準卸価格と並べて表示
+                    standard_prices = master.price_book.standard_prices(products, quote['quote_date'])
+                    for p, standard_price in zip(products, standard_prices):
+                        text = f"・{p['name']} - {p['wholesale_price']}円"
+                        if standard_price is not None:
+                            text += f"（標準 {standard_price}円）"
                         special = p.get('special_condition', '')
                         if special:
-                            st.caption(f"・{p['name']} - {p['wholesale_price']}円（条件: {special}円）")
-                        else:
-                            st.caption(f"・{p['name']} - {p['wholesale_price']}円")
+                            text += f"（条件: {special}円）"
+                        st.caption(text)
 
             with col2:
                 # 再ダウンロードボタン
                 if st.button("📥 PDF再生成", key=f"dl_{quote['id']}"):
                     try:
-                        pdf_data = generate_pdf(
-                            recipient=quote['recipient'],
-                            retailer=quote.get('retailer', ''),
-                            show_retailer=bool(quote.get('retailer')),
-                            staff=quote['staff'],
-                            quote_date=quote['quote_date'],
-                            sales_area=quote['sales_area'],
-                            products=quote['products'],
-                            notes=quote.get('notes', '')
-                        )
+                        pdf_data = load_quote_pdf(quote)
                         st.download_button(
                             label="⬇️ ダウンロード",
                             data=pdf_data,
@@ -609,31 +817,67 @@ def show_quote_history():
                     st.success("削除しました")
                     st.rerun()
 
+    # ページ送り
+    total_pages = max(1, -(-total_count // DEFAULT_PAGE_SIZE))
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ 前へ", disabled=page_number <= 1, use_container_width=True):
+            page_cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"ページ {page_number} / {total_pages}")
+    with col_next:
+        if st.button("次へ ▶", disabled=next_cursor is None, use_container_width=True):
+            page_cursors.append(next_cursor)
+            st.rerun()
+
+    # 検索結果キャッシュ・生成済みPDFのメモの効き具合、生成物ストアの使用量、PDF生成の準備時間
+    cache_stats = get_query_cache().stats()
+    memo_stats = get_pdf_memo().stats()
+    store_stats = get_artifact_store().stats()
+    font_stats = get_font_load_stats()
+    if font_stats and 'warmup_seconds' in font_stats:
+        warmup = (f"{font_stats['font_name']} 登録 {font_stats['seconds'] * 1000:.0f} ms"
+                  f"・準備 {font_stats['warmup_seconds'] * 1000:.0f} ms")
+    else:
+        warmup = "準備中"
+    st.caption(
+        f"検索キャッシュ: ヒット {cache_stats['hits']}件 / ミス {cache_stats['misses']}件"
+        f"（ヒット率 {cache_stats['hit_rate']:.0%}）"
+        f"　PDFメモ: ヒット {memo_stats['hits']}件 / ミス {memo_stats['misses']}件"
+        f"（{memo_stats['bytes'] / 1024 / 1024:.1f} MB）"
+        f"　生成物: {store_stats['entries']}件"
+        f"（メモリ {store_stats['memory_bytes'] / 1024 / 1024:.1f} / {store_stats['memory_limit'] / 1024 / 1024:.0f} MB"
+        f"・ディスク {store_stats['disk_bytes'] / 1024 / 1024:.1f} MB）"
+        f"　PDF準備: {warmup}"
+    )
 
-def show_product_master():
+
+def show_product_master(master):
     """商品マスターページ"""
 
     st.markdown('<h1 class="main-header">商品マスター</h1>', unsafe_allow_html=True)
 
-    st.write(f"**登録商品数**: {len(PRODUCTS)}件")
+    st.write(f"**登録商品数**: {len(master.catalog)}件")
+    st.caption(f"データ: {master.source.name if master.source else 'products.py'}")
 
     # 商品データをDataFrame用に整形
     product_data = []
-    for p in PRODUCTS:
+    for p in master.catalog:
         product_data.append({
-            "商品名": p['name'],
-            "ブランド": p.get('brand', '-'),
-            "カテゴリ": p.get('category', '-'),
-            "JANコード": p['jan'],
-            "ITFコード": p['itf'],
-            "ケースJAN": p.get('case_jan', '-'),
-            "容量": p['volume'],
-            "ケース入数": p['case_qty'],
-            "想定小売価格": f"¥{p['retail_price']}",
-            "標準卸価格": f"¥{p['wholesale_price']}",
-            "賞味期限": f"D{p['shelf_life']}",
-            "温度帯": p['temperature'],
-            "発注ロット": p.get('order_lot', '-'),
+            "商品名": p.name,
+            "ブランド": p.brand,
+            "カテゴリ": p.category,
+            "JANコード": p.jan,
+            "ITFコード": p.itf,
+            "ケースJAN": p.case_jan,
+            "容量": p.volume,
+            "ケース入数": p.case_qty,
+            "想定小売価格": f"¥{p.retail_price}",
+            "標準卸価格": f"¥{p.wholesale_price}",
+            "賞味期限": f"D{p.shelf_life}",
+            "温度帯": p.temperature,
+            "発注ロット": p.order_lot,
         })
 
     df = pd.DataFrame(product_data)
@@ -651,35 +895,39 @@ def show_product_master():
     # 商品カード形式での詳細表示
     st.subheader("📦 商品詳細")
 
-    for product in PRODUCTS:
-        with st.expander(f"**{product['name']}**", expanded=False):
+    for product in master.catalog:
+        with st.expander(f"**{product.name}**", expanded=False):
             col1, col2 = st.columns([1, 3])
 
             with col1:
                 # 商品画像
-                image_path = IMAGE_FOLDER / product.get('image', '')
-                if image_path.exists():
-                    st.image(str(image_path), width=120)
-                else:
-                    st.write("📦 画像なし")
+                show_product_image(product, width=120, missing="📦 画像なし")
 
             with col2:
-                st.write(f"**ブランド**: {product.get('brand', '-')}")
-                st.write(f"**カテゴリ**: {product.get('category', '-')}")
-                st.write(f"**販売者**: {product.get('seller', '-')}")
+                st.write(f"**ブランド**: {product.brand}")
+                st.write(f"**カテゴリ**: {product.category}")
+                st.write(f"**販売者**: {product.seller}")
                 st.divider()
-                st.write(f"**JANコード**: {product['jan']}")
-                st.write(f"**ITFコード**: {product['itf']}")
-                st.write(f"**ケースJAN**: {product.get('case_jan', '-')}")
+                st.write(f"**JANコード**: {product.jan}")
+                st.write(f"**ITFコード**: {product.itf}")
+                st.write(f"**ケースJAN**: {product.case_jan}")
                 st.divider()
-                st.write(f"**容量**: {product['volume']}")
-                st.write(f"**ケース入数**: {product['case_qty']}")
-                st.write(f"**発注ロット**: {product.get('order_lot', '-')}")
+                st.write(f"**容量**: {product.volume}")
+                st.write(f"**ケース入数**: {product.case_qty}")
+                st.write(f"**発注ロット**: {product.order_lot}")
                 st.divider()
-                st.write(f"**想定小売価格**: ¥{product['retail_price']}")
-                st.write(f"**標準卸価格**: ¥{product['wholesale_price']}")
-                st.write(f"**賞味期限**: D{product['shelf_life']}")
-                st.write(f"**温度帯**: {product['temperature']}")
+                st.write(f"**想定小売価格**: ¥{product.retail_price}")
+                st.write(f"**標準卸価格**: ¥{product.wholesale_price}")
+                lots = [lot['lot'] for lot in master.water_lot_patterns] if product.is_water else [NO_LOT]
+                for lot in lots:
+                    history = master.price_book.history(product.jan, lot)
+                    if history:
+                        label = f"価格改定履歴（{lot}）" if lot else "価格改定履歴"
+                        st.caption(f"{label}: " + " → ".join(
+                            f"{effective_date:%Y/%m/%d}〜 ¥{price}" for effective_date, price in history
+                        ))
+                st.write(f"**賞味期限**: D{product.shelf_life}")
+                st.write(f"**温度帯**: {product.temperature}")
 
 
 if __name__ == "__main__":
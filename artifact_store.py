@@ -0,0 +1,291 @@
+# 生成物ストアモジュール
+#
+# 作成したPDF・ZIPを全セッション共通の保存領域に置き、セッションにはハンドル（文字列）だけを持たせる。
+# メモリ上の合計バイト数が上限を超えたら古いものからディスクに退避し、
+# 一定時間使われなかったものは破棄する。
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import streamlit as st
+
+# 生成物ストアの既定値（secrets の [artifacts] で上書き可能）
+DEFAULT_MEMORY_LIMIT_MB = 128    # メモリに置く生成物の合計の上限（超えた分はディスクに退避）
+DEFAULT_DISK_LIMIT_MB = 1024     # ディスクに退避する生成物の合計の上限（超えた分は古いものから破棄）
+DEFAULT_TTL = 60 * 60            # 最後に使われてから破棄するまでの秒数
+
+# 退避先のフォルダ
+ARTIFACT_FOLDER = Path(__file__).parent / ".cache" / "artifacts"
+
+
+class _Artifact:
+    __slots__ = ('size', 'data', 'path', 'last_access', 'spilling')
+
+    def __init__(self, size, data, path, now):
+        self.size = size
+        self.data = data      # ディスクに退避したら None
+        self.path = path      # 退避先のパス
+        self.last_access = now
+        self.spilling = False  # ディスクに書き出し中か
+
+
+class ArtifactStore:
+    """生成物（PDF・ZIPなど）の共有ストア
+
+    put で保存してハンドルを受け取り、get でハンドルからデータを取り出す。
+    期限切れ・容量超過で破棄されたハンドルの get は None を返す。
+    1件でディスクの上限を超える生成物は、他の生成物を破棄せずに受け付けない（ハンドルは None）。
+    """
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT_MB * 1024 * 1024,
+                 disk_limit=DEFAULT_DISK_LIMIT_MB * 1024 * 1024, ttl=DEFAULT_TTL, folder=ARTIFACT_FOLDER):
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.ttl = ttl
+        self.folder = Path(folder)
+        self._entries = OrderedDict()   # ハンドル -> _Artifact（最後に使われた順）
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._spilling_bytes = 0        # 書き出し中の生成物の合計バイト数
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0       # ディスクに退避した件数
+        self.evictions = 0    # 期限切れ・容量超過で破棄した件数
+
+    def put(self, data):
+        """生成物を保存してハンドルを返す（メモリにもディスクにも置けない大きさなら None）"""
+        data = bytes(data)
+        if len(data) > self.memory_limit and len(data) > self.disk_limit:
+            return None
+        handle = uuid.uuid4().hex
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._entries[handle] = _Artifact(len(data), data, None, now)
+            self._memory_bytes += len(data)
+            spills = self._select_spills()
+        self._write_spills(spills)
+        return handle
+
+    def put_stream(self, write):
+        """write(ファイル) で書き出した内容を生成物として保存し、(ハンドル, write の戻り値) を返す
+
+        退避先のフォルダに直接書き出してディスクの生成物にするため、大きなZIP・CSVもメモリに載せない。
+        ファイルは読み書き両用で開くので、write は書き出した内容を読み返すこともできる。
+        書き出した内容がディスクの上限を超える場合は保存せずにハンドルを None とする。
+        write が例外を送出した場合は書きかけのファイルを削除してそのまま送出する。
+        """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w+b") as f:
+                value = write(f)
+                f.seek(0, os.SEEK_END)
+                too_large = f.tell() > self.disk_limit
+            if too_large:
+                Path(tmp_name).unlink()
+                return None, value
+            handle = uuid.uuid4().hex
+            path = self.folder / f"{handle}.bin"
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        size = path.stat().st_size
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._entries[handle] = _Artifact(size, None, path, now)
+            self._disk_bytes += size
+            self._trim_disk()
+        return handle, value
+
+    def get(self, handle):
+        """ハンドルの生成物を取得（破棄済みの場合は None）"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            artifact = self._entries.get(handle) if handle else None
+            if artifact is None:
+                self.misses += 1
+                return None
+            artifact.last_access = now
+            self._entries.move_to_end(handle)
+            if artifact.data is not None:
+                self.hits += 1
+                return artifact.data
+            path = artifact.path
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.discard(handle)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def contains(self, handle):
+        """ハンドルの生成物が残っているか（期限は延長しない）"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return bool(handle) and handle in self._entries
+
+    def discard(self, handle):
+        """ハンドルの生成物を破棄（不要になったとき呼び出す）"""
+        with self._lock:
+            artifact = self._entries.pop(handle, None) if handle else None
+            if artifact is not None:
+                self._remove(artifact)
+
+    def clear(self):
+        """全ての生成物を破棄（以前のプロセスが退避したファイルも削除）"""
+        with self._lock:
+            for artifact in self._entries.values():
+                self._remove(artifact)
+            self._entries.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = 0
+        for pattern in ("*.bin", "*.tmp"):
+            for path in self.folder.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def stats(self):
+        """保持しているバイト数・件数などの統計を取得"""
+        with self._lock:
+            self._expire(time.monotonic())
+            on_disk = sum(1 for artifact in self._entries.values() if artifact.data is None)
+            return {
+                'entries': len(self._entries),
+                'memory_entries': len(self._entries) - on_disk,
+                'disk_entries': on_disk,
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+                'memory_limit': self.memory_limit,
+                'disk_limit': self.disk_limit,
+                'hits': self.hits,
+                'misses': self.misses,
+                'spills': self.spills,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, artifact):
+        if artifact.data is not None:
+            self._memory_bytes -= artifact.size
+            artifact.data = None
+        elif artifact.path is not None:
+            self._disk_bytes -= artifact.size
+            artifact.path.unlink(missing_ok=True)
+            artifact.path = None
+
+    def _evict(self, handle):
+        self._remove(self._entries.pop(handle))
+        self.evictions += 1
+
+    def _expire(self, now):
+        """最後に使われてから ttl 秒を過ぎた生成物を破棄（古い順に並んでいるので先頭から見る）"""
+        while self._entries:
+            handle, artifact = next(iter(self._entries.items()))
+            if now - artifact.last_access < self.ttl:
+                break
+            self._evict(handle)
+
+    def _select_spills(self):
+        """メモリ上限を超えた分を古いものから選び、書き出し中の印を付けて返す（ロックを持って呼ぶ）"""
+        excess = self._memory_bytes - self._spilling_bytes - self.memory_limit
+        selected = []
+        for handle, artifact in list(self._entries.items()):
+            if excess <= 0:
+                break
+            if artifact.data is None or artifact.spilling:
+                continue
+            if artifact.size > self.disk_limit:
+                # ディスクに置けない大きさのものは退避せずに破棄する（他の退避分を押し出さない）
+                excess -= artifact.size
+                self._evict(handle)
+                continue
+            artifact.spilling = True
+            self._spilling_bytes += artifact.size
+            excess -= artifact.size
+            selected.append((handle, artifact))
+        return selected
+
+    def _write_spills(self, selected):
+        """選んだ生成物をディスクに退避（ロックを持たずに呼ぶ）
+
+        書き出しはロックの外で一時ファイルに行い、ロックの中では退避先への置き換えと
+        管理情報の更新だけを行う（書き出している間も他のセッションの get・put を待たせない）。
+        書き出している間に破棄された生成物のファイルは削除する。
+        """
+        for handle, artifact in selected:
+            data = artifact.data
+            tmp_name = None
+            if data is not None:
+                try:
+                    self.folder.mkdir(parents=True, exist_ok=True)
+                    fd, tmp_name = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                except OSError:
+                    if tmp_name is not None:
+                        Path(tmp_name).unlink(missing_ok=True)
+                    tmp_name = None
+
+            with self._lock:
+                artifact.spilling = False
+                self._spilling_bytes -= artifact.size
+                if self._entries.get(handle) is not artifact or artifact.data is None:
+                    if tmp_name is not None:
+                        Path(tmp_name).unlink(missing_ok=True)
+                    continue
+                if tmp_name is None:
+                    self._evict(handle)  # 退避できない場合は破棄してメモリ上限を守る
+                    continue
+                path = self.folder / f"{handle}.bin"
+                os.replace(tmp_name, path)
+                self._memory_bytes -= artifact.size
+                self._disk_bytes += artifact.size
+                artifact.data = None
+                artifact.path = path
+                self.spills += 1
+                self._trim_disk()
+
+    def _trim_disk(self):
+        """ディスク上限を超えた分を古いものから破棄（ロックを持って呼ぶ）"""
+        if self._disk_bytes > self.disk_limit:
+            for handle, artifact in list(self._entries.items()):
+                if self._disk_bytes <= self.disk_limit:
+                    break
+                if artifact.data is None:
+                    self._evict(handle)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """プロセス共通の生成物ストアを取得（初回呼び出し時に作成し、前回の退避ファイルを削除）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = st.secrets.get("artifacts", {})
+                store = ArtifactStore(
+                    memory_limit=int(float(config.get("memory_limit_mb", DEFAULT_MEMORY_LIMIT_MB)) * 1024 * 1024),
+                    disk_limit=int(float(config.get("disk_limit_mb", DEFAULT_DISK_LIMIT_MB)) * 1024 * 1024),
+                    ttl=float(config.get("ttl", DEFAULT_TTL)),
+                )
+                store.clear()
+                _store = store
+    return _store
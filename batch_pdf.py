@@ -0,0 +1,209 @@
+# 見積PDFの一括生成モジュール
+#
+# 複数の見積PDFをCPUコア数分のプロセスで並列に生成し、ZIPにまとめて書き出す。
+# ワーカープロセスで読み込まれるため、このモジュールでは streamlit・database を import しない。
+
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import PurePath
+
+import pdf_generator
+from pdf_generator import generate_pdf, get_pdf_filename, get_pdf_inputs, get_quote_hash
+
+# ワーカープロセス数（CPUコア数）
+MAX_WORKERS = os.cpu_count() or 1
+
+# ワーカー1つあたりに同時に投入しておく見積の件数（生成済みPDFを溜め込まないため）
+PENDING_PER_WORKER = 2
+
+# 1つのZIPに含めるPDFの合計バイト数の上限（超えた分の見積は含めず、失敗として記録する）
+MAX_ZIP_BYTES = 256 * 1024 * 1024
+
+
+def _init_worker():
+    """ワーカープロセスの初期化（フォント登録・テンプレート作成を先に済ませておく）"""
+    pdf_generator.register_font()
+    pdf_generator.get_quote_template()
+
+
+def render_quote_pdf(pdf_inputs):
+    """ワーカープロセスで見積PDFを生成（PDFデータと見積入力のハッシュを返す）"""
+    return generate_pdf(**pdf_inputs), get_quote_hash(**pdf_inputs)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """プロセス共通のPDF生成用プロセスプールを取得（初回呼び出し時に作成）
+
+    Streamlit のスクリプトスレッドから安全に使えるよう spawn でワーカーを起動する。
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+    return _pool
+
+
+def _discard_process_pool(pool):
+    """ワーカーが異常終了したプールを破棄（次回の get_process_pool で作り直す）"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _unique_name(filename, used_names):
+    """ZIP内で重複しないファイル名を返す（同じ送付先・日付の見積は「(2)」などを付ける）"""
+    name = filename
+    path = PurePath(filename)
+    number = 2
+    while name in used_names:
+        name = f"{path.stem} ({number}){path.suffix}"
+        number += 1
+    used_names.add(name)
+    return name
+
+
+class BatchResult:
+    """一括生成の結果（ZIPに含めたファイル名と失敗した見積）"""
+
+    def __init__(self, total):
+        self.total = total
+        self.files = []
+        self.failures = []      # (見積ID, ファイル名, エラーメッセージ)
+        self.save_errors = []   # on_rendered が失敗した見積（ZIPには含めた）: (見積ID, ファイル名, エラーメッセージ)
+        self.reused = 0         # 保存済みPDFをそのまま使った件数
+        self.rendered = 0       # 新たに生成した件数
+        self.bytes = 0          # ZIPに含めたPDFの合計バイト数
+        self.truncated = False  # サイズ上限に達して含めなかった見積があるか
+
+    @property
+    def completed(self):
+        return len(self.files) + len(self.failures)
+
+
+def write_quotes_pdf_zip(quotes, output, total, on_progress=None, on_rendered=None, max_bytes=MAX_ZIP_BYTES):
+    """見積PDFを並列に生成してZIPに書き出す
+
+    quotes には (見積, 保存済みPDFデータまたは None) のタプルを順に渡す。
+    保存済みPDFはそのまま使い、ないものだけをプロセスプールで生成する。
+    ZIP内のファイル名は get_pdf_filename で作成し、重複時は連番を付ける。
+
+    on_progress(完了件数, 全件数) は1件終わるごと、
+    on_rendered(見積ID, ハッシュ, PDFデータ, ファイル名) は新たに生成するごとに呼ばれる。
+    個々の見積の失敗は BatchResult.failures に、on_rendered の失敗は BatchResult.save_errors に
+    記録して残りの処理を続ける（on_progress の例外はそのまま送出する）。
+    PDFの合計が max_bytes を超える見積はZIPに含めず、以降の生成も行わない。
+    """
+    result = BatchResult(total)
+    used_names = set()
+    pool = get_process_pool()
+    pending = {}
+    max_pending = MAX_WORKERS * PENDING_PER_WORKER
+    too_large = f"ZIPのサイズ上限（{max_bytes / 1024 / 1024:.0f} MB）を超えるため含めませんでした"
+
+    def report():
+        if on_progress:
+            on_progress(result.completed, total)
+
+    def discard_pool():
+        # ワーカーが落ちたら以降の生成は新しいプールで行う
+        nonlocal pool
+        _discard_process_pool(pool)
+        pool = get_process_pool()
+
+    def submit(pdf_inputs):
+        """プールに生成を投入（プールが壊れていたら作り直して1度だけやり直す）"""
+        try:
+            return pool.submit(render_quote_pdf, pdf_inputs)
+        except (BrokenProcessPool, RuntimeError):
+            # RuntimeError: 他の一括生成が壊れたプールを破棄して shutdown 済みの場合
+            discard_pool()
+            return pool.submit(render_quote_pdf, pdf_inputs)
+
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+
+        def add(quote_id, filename, pdf_data):
+            """ZIPにPDFを追加（サイズ上限を超える場合は追加せず False）"""
+            if result.truncated or result.bytes + len(pdf_data) > max_bytes:
+                result.truncated = True
+                result.failures.append((quote_id, filename, too_large))
+                return False
+            name = _unique_name(filename, used_names)
+            archive.writestr(name, pdf_data)
+            result.files.append(name)
+            result.bytes += len(pdf_data)
+            return True
+
+        def finish(done):
+            for future in done:
+                quote_id, filename = pending.pop(future)
+                try:
+                    pdf_data, pdf_hash = future.result()
+                except BrokenProcessPool as e:
+                    discard_pool()
+                    result.failures.append((quote_id, filename, str(e) or "ワーカープロセスが異常終了しました"))
+                except Exception as e:
+                    result.failures.append((quote_id, filename, str(e)))
+                else:
+                    if add(quote_id, filename, pdf_data):
+                        result.rendered += 1
+                    if on_rendered:
+                        # 保存に失敗してもZIPには含める（次回また生成される）。失敗は呼び出し元に返す
+                        try:
+                            on_rendered(quote_id, pdf_hash, pdf_data, filename)
+                        except Exception as e:
+                            result.save_errors.append((quote_id, filename, str(e)))
+                report()
+
+        for quote, pdf_data in quotes:
+            try:
+                filename = get_pdf_filename(quote['recipient'], quote['quote_date'])
+                pdf_inputs = get_pdf_inputs(quote) if pdf_data is None else None
+            except Exception as e:
+                result.failures.append((quote.get('id'), "", str(e)))
+                report()
+                continue
+
+            if pdf_data is not None:
+                if add(quote['id'], filename, pdf_data):
+                    result.reused += 1
+                report()
+                continue
+
+            if result.truncated:
+                result.failures.append((quote['id'], filename, too_large))
+                report()
+                continue
+
+            while len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                finish(done)
+
+            try:
+                future = submit(pdf_inputs)
+            except (BrokenProcessPool, RuntimeError) as e:
+                # 作り直したプールでも投入できない場合は、この見積を失敗として残りを続ける
+                result.failures.append((quote['id'], filename, str(e) or "ワーカープロセスを起動できませんでした"))
+                report()
+                continue
+            pending[future] = (quote['id'], filename)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            finish(done)
+
+    return result
@@ -0,0 +1,335 @@
+# 性能計測スクリプト
+#
+# 使い方: python benchmark.py [計測名 ...]
+# 計測名を省略すると全ての計測を実行する。
+# compare は canvas 描画と platypus 描画の見た目の一致を確認する（不一致・PyMuPDF がない場合は終了コード1）。
+# 同じ比較は tests/test_pdf_engines.py でも pytest から実行できる（pip install -r requirements-dev.txt）。
+# サンプルの見積入力と比較の処理は quote_samples.py にある。
+
+import os
+import sys
+import time
+
+from products import CATALOG
+from quote_samples import compare_quote_pdfs, engine_comparison_cases, render_pdf, sample_products, sample_quote
+
+
+def measure(func, repeat=5):
+    """func を repeat 回実行し、最短時間（秒）と最後の戻り値を返す"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_images():
+    """縮小画像の有無によるPDFサイズと生成時間の比較"""
+    import pdf_generator
+
+    quote = sample_quote()
+    render_pdf(quote)  # フォント登録・縮小画像作成を済ませておく
+
+    results = {}
+    for use_thumbnails in (False, True):
+        pdf_generator.USE_IMAGE_THUMBNAILS = use_thumbnails
+        results[use_thumbnails] = measure(lambda: render_pdf(quote))
+    pdf_generator.USE_IMAGE_THUMBNAILS = True
+
+    print("[images] 全商品の見積PDF")
+    for label, use_thumbnails in (("元画像", False), ("縮小画像", True)):
+        seconds, pdf_data = results[use_thumbnails]
+        print(f"  {label:<6}: {len(pdf_data) / 1024:8.1f} KB  {seconds * 1000:8.1f} ms")
+
+
+def bench_template():
+    """見積書テンプレートの再利用による1回あたりの短縮時間"""
+    import pdf_generator
+
+    quote = sample_quote(sample_products()[:3])
+    render_pdf(quote)
+
+    build_seconds, _ = measure(lambda: pdf_generator.QuoteTemplate(pdf_generator.FONT_NAME), repeat=50)
+
+    def generate_cold():
+        pdf_generator._templates.clear()
+        return render_pdf(quote)
+
+    cold_seconds, _ = measure(generate_cold, repeat=20)
+    warm_seconds, _ = measure(lambda: render_pdf(quote), repeat=20)
+
+    print("[template] 商品3件の見積PDF")
+    print(f"  テンプレート作成      : {build_seconds * 1000:8.2f} ms")
+    print(f"  毎回作成（従来方式）  : {cold_seconds * 1000:8.2f} ms/回")
+    print(f"  テンプレート再利用    : {warm_seconds * 1000:8.2f} ms/回")
+
+
+def bench_engine():
+    """描画方式（platypus / canvas）ごとの生成時間の比較"""
+    import pdf_generator
+
+    print("[engine] 描画方式ごとの生成時間")
+    for count in (3, len(sample_products())):
+        quote = sample_quote(sample_products()[:count])
+        for engine in pdf_generator.ENGINES:
+            render_pdf(quote, engine=engine)
+            seconds, _ = measure(lambda: render_pdf(quote, engine=engine), repeat=10)
+            print(f"  商品{count:>3}件 {engine:<8}: {seconds * 1000:8.1f} ms")
+
+
+def bench_scaling():
+    """商品行数（10〜1,000行）に対する生成時間の伸び（行数に比例することの確認）
+
+    フォント・画像の埋め込みなど行数によらない固定費があるため、
+    前の行数からの増分を1行あたりに換算して比べる（行数に比例していればほぼ一定になる）。
+    """
+    import pdf_generator
+
+    products = sample_products()
+    render_pdf(sample_quote(products))
+
+    print("[scaling] 商品行数ごとの生成時間")
+    for engine in pdf_generator.ENGINES:
+        previous = None
+        for count in (10, 100, 250, 500, 1000):
+            quote = sample_quote([products[i % len(products)] for i in range(count)])
+            seconds, pdf_data = measure(lambda: render_pdf(quote, engine=engine), repeat=3)
+            line = f"  {engine:<8} {count:>5}行: {seconds * 1000:9.1f} ms  {len(pdf_data) / 1024:8.1f} KB"
+            if previous:
+                prev_count, prev_seconds = previous
+                marginal = (seconds - prev_seconds) / (count - prev_count)
+                line += f"  増分 1行あたり {marginal * 1000:5.2f} ms"
+            print(line)
+            previous = (count, seconds)
+
+
+def bench_memo():
+    """決定的モードと生成済みPDFのメモによる再生成時間の比較"""
+    import pdf_generator
+
+    quote = sample_quote()
+    first = render_pdf(quote)
+    second = render_pdf(quote)
+    cold_seconds, _ = measure(lambda: render_pdf(quote))
+    warm_seconds, _ = measure(lambda: pdf_generator.generate_pdf(**quote), repeat=20)
+
+    print("[memo] 全商品の見積PDFの再生成")
+    print(f"  同じ入力で同じバイト列: {'はい' if first == second else 'いいえ'}")
+    print(f"  メモなし: {cold_seconds * 1000:8.2f} ms")
+    print(f"  メモあり: {warm_seconds * 1000:8.2f} ms")
+
+
+def bench_font():
+    """フォントファイルの解析時間（起動直後、新しいプロセスで1回目）と、PDF生成の準備全体の時間"""
+    import subprocess
+    import pdf_generator
+
+    pdf_generator.register_font()
+    stats = pdf_generator.get_font_load_stats()
+    if not stats['path']:
+        print("[font] 日本語フォントが見つからないため省略")
+        return
+
+    # 起動直後と同じ状態で測るため、新しいプロセスで準備を1回だけ行う
+    code = (
+        "import pdf_generator as g; g._warm_up(); s = g.get_font_load_stats();"
+        " print(s['seconds'], s['warmup_seconds'])"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    font_seconds, warmup_seconds = map(float, output.split()[-2:])
+
+    print(f"[font] {stats['font_name']}（{stats['path']}）起動直後の1回目")
+    print(f"  フォント登録（ファイルを解析）: {font_seconds * 1000:8.1f} ms")
+    print(f"  準備全体（バックグラウンド）  : {warmup_seconds * 1000:8.1f} ms")
+
+
+def sample_history(count):
+    """CSV出力用の見積履歴のサンプルを作成（商品の組み合わせ・特別条件を見積ごとに変える）"""
+    products = sample_products()
+    quotes = []
+    for i in range(count):
+        selected = [
+            dict(p, special_condition='5' if (i + j) % 3 == 0 else '')
+            for j, p in enumerate(products) if (i + j) % 4 != 0
+        ]
+        quotes.append({
+            'retailer': "セブンイレブン" if i % 2 else "",
+            'recipient': f"送付先{i % 50}",
+            'quote_date': f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            'staff': "室屋",
+            'products': selected,
+        })
+    return quotes
+
+
+def _history_line_items(quotes):
+    """見積履歴のサンプルを database.iter_quote_items_for_export と同じ明細の行（縦持ち）に展開"""
+    rows = []
+    for quote_id, quote in enumerate(quotes):
+        head = (quote_id, quote['retailer'], quote['recipient'], quote['quote_date'], quote['staff'])
+        if not quote['products']:
+            rows.append((*head, None, None, None, None))
+        for p in quote['products']:
+            rows.append((*head, p['short_name'], p.get('order_lot', ''), p['wholesale_price'],
+                         p['special_condition']))
+    return rows
+
+
+def bench_csv():
+    """見積履歴CSVの作成時間（見積1件ずつ行を作る方法と、明細をまとめて横持ちに振り分ける方法、100〜10万件）"""
+    import io
+    from csv_export import generate_quotes_csv, write_quotes_csv
+
+    batch_size = 5000  # database.EXPORT_BATCH_SIZE と同じ（database は import 時にDBに接続するため読み込まない）
+
+    def pivot(rows):
+        output = io.BytesIO()
+        write_quotes_csv((rows[i:i + batch_size] for i in range(0, len(rows), batch_size)), output)
+        return output.getvalue()
+
+    print("[csv] 見積件数ごとのCSV作成時間")
+    for count in (100, 1000, 10000, 100000):
+        quotes = sample_history(count)
+        rows = _history_line_items(quotes)
+        repeat = 3 if count <= 10000 else 1
+        loop_seconds, loop_csv = measure(lambda: generate_quotes_csv(quotes), repeat=repeat)
+        pivot_seconds, pivot_csv = measure(lambda: pivot(rows), repeat=repeat)
+        same = "一致" if loop_csv == pivot_csv else "不一致"
+        print(f"  {count:>6}件: 1件ずつ {loop_seconds * 1000:9.1f} ms  一括振り分け {pivot_seconds * 1000:9.1f} ms"
+              f"  （出力{same}）")
+
+
+def bench_price_book():
+    """過去の見積の明細の標準卸価格を価格表でまとめて求める時間（改定回数を変えて計測）"""
+    from datetime import date, timedelta
+    from price_book import PriceBook, item_lot
+
+    products = sample_products()
+    quotes = sample_history(10000)
+    lookups = [
+        (item['jan'], item_lot(item), quote['quote_date'])
+        for quote in quotes for item in quote['products']
+    ]
+
+    print(f"[price_book] 明細 {len(lookups)}件の標準卸価格の検索時間")
+    for revisions in (1, 10, 100, 1000):
+        # 2020年から2026年末までの間に均等な間隔で価格を改定した価格表
+        step = timedelta(days=max(1, 2557 // revisions))
+        book = PriceBook([
+            (item['jan'], item_lot(item), date(2020, 1, 1) + step * i, 100 + i % 20)
+            for item in products for i in range(revisions)
+        ])
+        seconds, prices = measure(lambda: book.prices_as_of(lookups))
+        print(f"  改定 {revisions:>4}回/商品: {seconds * 1000:7.1f} ms"
+              f"（1件 {seconds / len(lookups) * 1e6:.2f} µs・不明 {prices.count(None)}件）")
+
+
+def _show_product_images(images, width, output_format):
+    """商品画像を st.image で表示するだけの画面（AppTest で実行する）
+
+    配信用に登録された画像のバイト数をセッション状態の media_bytes に記録する。
+    """
+    import streamlit as st
+    from streamlit import runtime
+
+    for image in images:
+        st.image(image, width=width, output_format=output_format)
+
+    storage = runtime.get_instance().media_file_mgr._storage
+    st.session_state.media_bytes = sum(len(f.content) for f in storage._files_by_id.values())
+
+
+def bench_ui_images():
+    """商品カードの画像（元画像・縮小画像）の転送量と画面の描画時間の比較
+
+    転送量はブラウザに実際に送られるバイト数（画面の差分メッセージ＋ /media で配信される画像）。
+    描画時間は全商品の画像を st.image で表示する画面を AppTest で実行した時間
+    （サーバー側で最初の画面ができるまでの時間）。縮小画像はキャッシュ済みの状態で計測する。
+    """
+    from streamlit.testing.v1 import AppTest
+    import image_cache
+
+    width = 80
+    filenames = sorted({p.image for p in CATALOG if (image_cache.IMAGE_FOLDER / p.image).exists()})
+    paths = [str(image_cache.IMAGE_FOLDER / name) for name in filenames]
+
+    start = time.perf_counter()
+    thumbnails = [str(image_cache.get_ui_thumbnail(name, width)) for name in filenames]
+    first_seconds = time.perf_counter() - start
+
+    def run_page(images, output_format):
+        return AppTest.from_function(
+            _show_product_images, args=(images, width, output_format), default_timeout=60,
+        ).run()
+
+    def page_seconds(images, output_format="auto"):
+        return measure(lambda: run_page(images, output_format), repeat=3)[0]
+
+    def sent_bytes(images, output_format="auto"):
+        at = run_page(images, output_format)
+        message_bytes = sum(len(element.proto.SerializeToString()) for element in at.get("image"))
+        return message_bytes, at.session_state.media_bytes
+
+    page_seconds([])  # 初回の読み込みを済ませておく
+    base_seconds = page_seconds([])
+    original_seconds = page_seconds(paths)
+    thumbnail_seconds = page_seconds(thumbnails, "PNG")
+
+    source_bytes = sum((image_cache.IMAGE_FOLDER / name).stat().st_size for name in filenames)
+    thumbnail_file_bytes = sum(os.path.getsize(path) for path in thumbnails)
+    original_message, original_media = sent_bytes(paths)
+    thumbnail_message, thumbnail_media = sent_bytes(thumbnails, "PNG")
+
+    print(f"[ui_images] 商品画像{len(filenames)}枚（表示幅 {width}px）")
+    print(f"  元画像（{source_bytes / 1024:,.0f} KB を毎回縮小）: 転送 {(original_message + original_media) / 1024:7.1f} KB"
+          f"（画像 {original_media / 1024:.1f} KB）  描画 {original_seconds * 1000:7.1f} ms")
+    print(f"  縮小画像（{image_cache.UI_THUMBNAIL_COLORS}色 PNG）: 転送 {(thumbnail_message + thumbnail_media) / 1024:7.1f} KB"
+          f"（画像 {thumbnail_media / 1024:.1f} KB・ファイルのまま配信: {'はい' if thumbnail_media == thumbnail_file_bytes else 'いいえ'}）"
+          f"  描画 {thumbnail_seconds * 1000:7.1f} ms")
+    print(f"  （画像なしの画面の実行時間: {base_seconds * 1000:.1f} ms）")
+    print(f"  縮小画像の初回作成（キャッシュ済みなら読み込みのみ）: {first_seconds * 1000:7.1f} ms")
+
+
+def compare_engines():
+    """canvas 描画が platypus と見た目で一致するかを確認（PyMuPDF が必要、なければ終了コード1）"""
+    try:
+        import pymupdf  # noqa: F401
+    except ImportError:
+        print("[compare] PyMuPDF がないため比較できません（pip install -r requirements-dev.txt）", file=sys.stderr)
+        sys.exit(1)
+
+    print("[compare] platypus と canvas の描画結果の差分画素数")
+    failed = False
+    for label, quote in engine_comparison_cases().items():
+        diffs = compare_quote_pdfs(quote)
+        ok = diffs is not None and not any(diffs)
+        failed = failed or not ok
+        print(f"  {'OK' if ok else 'NG'} {label}: {'ページ数不一致' if diffs is None else diffs}")
+    if failed:
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    'images': bench_images,
+    'template': bench_template,
+    'engine': bench_engine,
+    'scaling': bench_scaling,
+    'memo': bench_memo,
+    'font': bench_font,
+    'ui_images': bench_ui_images,
+    'csv': bench_csv,
+    'price_book': bench_price_book,
+    'compare': compare_engines,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,298 @@
+# CSV出力モジュール
+
+import csv
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import get_artifact_store
+from master_data import get_master_data
+
+# 作成済みCSVを保持する検索条件の数
+EXPORT_CACHE_MAX_ENTRIES = 16
+
+
+def get_csv_product_order():
+    """CSV出力用の商品リスト（現在の商品マスタの表示順の short_name）"""
+    return list(get_master_data().catalog.short_names())
+
+
+def get_csv_headers(product_order=None):
+    """CSVのヘッダー行を作成"""
+    if product_order is None:
+        product_order = get_csv_product_order()
+    headers = ["対象小売", "送付先", "日付", "担当者"]
+    for product_name in product_order:
+        headers.append(product_name)
+        headers.append("特別条件")
+    return headers
+
+
+def _short_lot(lot):
+    """ロット名を短縮（例: "10ケース" → "10cs"）"""
+    return lot.replace('ケース', 'cs').replace('（パレット）', '')
+
+
+def build_csv_row(quote, products, product_order=None):
+    """見積1件分のCSVデータ行を作成（product_order は列の商品の順、省略時は現在の商品マスタの順）"""
+    if product_order is None:
+        product_order = get_csv_product_order()
+    row = [
+        quote.get('retailer', ''),
+        quote.get('recipient', ''),
+        quote.get('quote_date', ''),
+        quote.get('staff', ''),
+    ]
+
+    # 見積に含まれる商品をマッピング
+    quote_products = {}
+    water_items = []  # 2Water用（複数ロット対応）
+
+    for p in products:
+        short_name = p.get('short_name', '')
+
+        # 2Waterは複数ロット選択の可能性があるので別処理
+        if short_name == '2Water':
+            lot = p.get('order_lot', '')
+            lot_short = _short_lot(lot)
+            water_items.append({
+                'lot': lot_short,
+                'price': p.get('wholesale_price', ''),
+                'special': p.get('special_condition', '')
+            })
+        else:
+            quote_products[short_name] = {
+                'price': p.get('wholesale_price', ''),
+                'special': p.get('special_condition', '')
+            }
+
+    # 2Waterを結合形式でまとめる
+    if water_items:
+        price_parts = []
+        special_parts = []
+        for item in water_items:
+            price_parts.append(f"{item['lot']}:{item['price']}円")
+            if item['special']:
+                special_parts.append(f"{item['lot']}:{item['special']}円")
+        quote_products['2Water'] = {
+            'price': ', '.join(price_parts),
+            'special': ', '.join(special_parts) if special_parts else ''
+        }
+
+    # 各商品の価格と特別条件を追加
+    for product_name in product_order:
+        if product_name in quote_products:
+            row.append(quote_products[product_name]['price'])
+            row.append(quote_products[product_name]['special'])
+        else:
+            row.append('')
+            row.append('')
+
+    return row
+
+
+def generate_quotes_csv(quotes):
+    """見積履歴をCSV形式で生成"""
+    product_order = get_csv_product_order()
+    headers = get_csv_headers(product_order)
+    rows = [build_csv_row(quote, quote.get('products', []), product_order) for quote in quotes]
+
+    # DataFrameを作成してCSV出力
+    df = pd.DataFrame(rows, columns=headers)
+
+    # CSVをバイト列として出力（BOM付きUTF-8でExcel対応）
+    output = io.BytesIO()
+    df.to_csv(output, index=False, encoding='utf-8-sig')
+    output.seek(0)
+
+    return output.getvalue()
+
+
+def _join_water_lots(quote_rows, lots, prices, specials):
+    """2Waterの明細のロット別価格・特別条件を見積ごとに「10cs:118円, ...」の形式で連結
+
+    引数は2Waterの明細ごとの配列（quote_rows は見積の行番号で、同じ見積の明細は連続している）。
+    戻り値: (見積の行番号, 価格の文字列, 特別条件の文字列)
+    """
+    separator = ', '
+    codes, uniques = pd.factorize(lots)
+    lot_short = np.array([_short_lot(lot) for lot in uniques], dtype=object)[codes]
+    has_special = np.array([bool(special) for special in specials], dtype=bool)
+
+    # 区切りを先頭に付けた文字列を見積ごとに足し合わせ、最後に先頭の区切りを外す
+    price_parts = separator + lot_short + ':' + np.array([str(price) for price in prices], dtype=object) + '円'
+    special_parts = np.full(len(lots), '', dtype=object)
+    special_parts[has_special] = (
+        separator + lot_short[has_special] + ':'
+        + np.array([str(special) for special in specials[has_special]], dtype=object) + '円'
+    )
+    starts = np.flatnonzero(np.r_[True, quote_rows[1:] != quote_rows[:-1]])
+    return (
+        quote_rows[starts],
+        [text[len(separator):] for text in np.add.reduceat(price_parts, starts)],
+        [text[len(separator):] for text in np.add.reduceat(special_parts, starts)],
+    )
+
+
+def _pivot_line_items(rows, product_order):
+    """明細の行（縦持ち）を見積1件1行（横持ち）のCSVデータ行に振り分ける
+
+    rows は database.iter_quote_items_for_export の行で、含まれる見積の明細がすべて揃っていること。
+    build_csv_row と同じ値の行を、明細ごとのループではなく列ごとの配列の処理で作成する。
+    """
+    (quote_ids, retailers, recipients, quote_dates, staffs,
+     short_names, order_lots, prices, specials) = np.array(rows, dtype=object).T
+
+    # 見積が変わる位置で区切り、明細ごとに見積の行番号を振る
+    is_start = np.r_[True, quote_ids[1:] != quote_ids[:-1]]
+    quote_rows = np.cumsum(is_start) - 1
+    starts = np.flatnonzero(is_start)
+
+    base_count = 4
+    table = np.full((len(starts), base_count + 2 * len(product_order)), '', dtype=object)
+    table[:, 0] = retailers[starts]
+    table[:, 1] = recipients[starts]
+    table[:, 2] = [str(quote_date) for quote_date in quote_dates[starts]]
+    table[:, 3] = staffs[starts]
+
+    # 明細のない見積の行（短縮名が None）と列にない商品は除き、各明細の価格の列を求める
+    order = {name: base_count + 2 * i for i, name in enumerate(product_order)}
+    codes, uniques = pd.factorize(short_names)
+    columns = np.array([order.get(name, -1) for name in uniques] + [-1], dtype=np.int64)[codes]
+    is_water = np.array([name == '2Water' for name in uniques] + [False], dtype=bool)[codes]
+    prices[pd.isna(prices)] = ''
+    specials[pd.isna(specials)] = ''
+
+    # 2Water以外: 同じ見積に同じ商品が複数ある場合は後のものを使う（build_csv_row と同じ）
+    selected = np.flatnonzero((columns >= 0) & ~is_water)
+    keys = pd.Series(quote_rows[selected] * table.shape[1] + columns[selected])
+    selected = selected[~keys.duplicated(keep='last').to_numpy()]
+    table[quote_rows[selected], columns[selected]] = prices[selected]
+    table[quote_rows[selected], columns[selected] + 1] = specials[selected]
+
+    # 2Water: ロット別の価格・特別条件を結合した文字列
+    water = np.flatnonzero(is_water)
+    if len(water) and '2Water' in order:
+        order_lots[pd.isna(order_lots)] = ''
+        water_rows, water_prices, water_specials = _join_water_lots(
+            quote_rows[water], order_lots[water], prices[water], specials[water]
+        )
+        table[water_rows, order['2Water']] = water_prices
+        table[water_rows, order['2Water'] + 1] = water_specials
+
+    return table.tolist()
+
+
+def write_quotes_csv(item_batches, output):
+    """見積の明細を受け取った順にまとめてCSVに書き出す（全件をメモリに載せない）
+
+    item_batches は database.iter_quote_items_for_export と同じ、明細の行のリストを順に返すイテラブル。
+    リストごとに明細を列ごとの配列にして横持ちに振り分ける（見積1件ずつの dict・ループを作らない）。
+    output はバイナリ書き込み用のファイルオブジェクトで、
+    generate_quotes_csv と同じ列構成・同じバイト列（BOM付きUTF-8）で出力する。
+    """
+    text_output = io.TextIOWrapper(output, encoding='utf-8-sig', newline='')
+    # 行ごとにエンコードしないよう、リストごとに文字列へまとめてから書き出す
+    buffer = io.StringIO()
+    # pandas の to_csv と同じ改行コードに合わせる
+    writer = csv.writer(buffer, lineterminator=os.linesep)
+
+    def flush_buffer():
+        text_output.write(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+
+    # 書き出し中に商品マスタが読み込み直されても列がずれないよう、最初に列の順を決める
+    product_order = get_csv_product_order()
+    writer.writerow(get_csv_headers(product_order))
+    flush_buffer()
+
+    # リストの最後の見積は次のリストに明細が続くことがあるため、次のリストと合わせて処理する
+    pending = []
+    for rows in item_batches:
+        rows = pending + list(rows)
+        if not rows:
+            continue
+        last_id = rows[-1][0]
+        split = len(rows) - 1
+        while split > 0 and rows[split - 1][0] == last_id:
+            split -= 1
+        rows, pending = rows[:split], rows[split:]
+        if rows:
+            writer.writerows(_pivot_line_items(rows, product_order))
+            flush_buffer()
+    if pending:
+        writer.writerows(_pivot_line_items(pending, product_order))
+        flush_buffer()
+
+    text_output.flush()
+    text_output.detach()  # output は閉じずに呼び出し元へ返す
+
+
+class CsvExportCache:
+    """作成済みCSVのキャッシュ
+
+    検索条件ごとに、作成した時点の見積の更新世代と生成物ストアのハンドルを持つ。
+    見積が保存・削除されて世代が変わったもの、ストアから破棄されたものは作り直す。
+    """
+
+    def __init__(self, max_entries=EXPORT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # 検索条件 -> (世代, ハンドル)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, generation, item_batches_factory):
+        """作成済みのCSVを返し、なければ item_batches_factory() の明細から作成して保存する
+
+        作成中は生成物ストアのファイルに直接書き出すため、件数が増えてもメモリ使用量は一定。
+        戻り値はCSV全体のバイト列（ダウンロード時に Streamlit がメモリに保持するため）。
+        """
+        store = get_artifact_store()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                csv_data = store.get(entry[1])
+                if csv_data is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return csv_data
+            self.misses += 1
+
+        def write(output):
+            write_quotes_csv(item_batches_factory(), output)
+            output.seek(0)
+            return output.read()
+
+        # ストアに保持できない大きさ（ハンドルが None）でも、作成したCSVはそのまま返す
+        handle, csv_data = store.put_stream(write)
+        if handle is None:
+            return csv_data
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                store.discard(previous[1])
+            self._entries[key] = (generation, handle)
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                store.discard(evicted)
+        return csv_data
+
+    def stats(self):
+        """ヒット数・ミス数などの統計を取得"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+_export_cache = CsvExportCache()
+
+
+def get_csv_export_cache():
+    """プロセス共通の作成済みCSVのキャッシュを取得"""
+    return _export_cache
@@ -1,142 +1,593 @@
 # データベース管理モジュール（Supabase PostgreSQL）
 
 import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 
 import streamlit as st
 import psycopg2
 import psycopg2.extras
-
-
+import psycopg2.pool
+
+# コネクションプールの既定値（secrets の [database] で上書き可能）
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 5
+DEFAULT_POOL_TIMEOUT = 30            # 空き接続を待つ最大秒数
+DEFAULT_HEALTH_CHECK_INTERVAL = 30   # この秒数以上アイドルだった接続は貸出前に疎通確認
+
+# 見積履歴の1ページあたりの件数
+DEFAULT_PAGE_SIZE = 20
+
+# 検索結果キャッシュの既定値（secrets の [database] で上書き可能）
+DEFAULT_QUERY_CACHE_TTL = 60            # 秒
+DEFAULT_QUERY_CACHE_MAX_ENTRIES = 256
+
+# CSV出力時にサーバーサイドカーソルから一度に取得する明細の行数（まとめて列ごとに処理する単位）
+EXPORT_BATCH_SIZE = 5000
+
+# PDF一括出力で1回に取得する見積の件数（PDFデータを含むため小さめ）
+PDF_BATCH_SIZE = 20
+
+# pg_trgm（部分一致・あいまい検索用のトライグラム索引）が使えるか（init_db で判定）
+TRIGRAM_SEARCH_ENABLED = False
+
+# トライグラム索引で検索するキーワードの最小文字数
+# （2文字以下の '%kw%' からはトライグラムを取り出せず索引が使えないため、ILIKE の逐次比較で検索する）
+MIN_TRIGRAM_KEYWORD_LENGTH = 3
+
+
+class ConnectionPool:
+    """プロセス全体で共有するPostgreSQL接続プール
+
+    アイドル接続を保持して再利用し、貸出時に切断済み・長時間アイドルの接続を
+    検査して、応答しなければ自動的に張り直す。
+    """
+
+    def __init__(self, dsn, min_size=DEFAULT_POOL_MIN_SIZE, max_size=DEFAULT_POOL_MAX_SIZE,
+                 timeout=DEFAULT_POOL_TIMEOUT, health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"不正なプールサイズです: min={min_size}, max={max_size}")
+
+        self._dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        # 貸出数の上限管理と、アイドル接続（最後に返却されたものから再利用）
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = queue.LifoQueue()
+        self._last_used = {}
+
+        # 最小接続数だけ事前に接続しておく
+        for _ in range(min_size):
+            conn = self._connect()
+            self._idle.put(conn)
+
+    def _connect(self):
+        conn = psycopg2.connect(self._dsn)
+        self._last_used[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        """接続が利用可能か確認（長時間アイドルの場合のみ SELECT 1 を発行）"""
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        idle_seconds = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle_seconds < self.health_check_interval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """接続を借りる（空きがなければ timeout 秒まで待つ）"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError("接続プールが枯渇しました")
+
+        try:
+            # アイドル接続を検査しながら取り出し、使えるものがなければ新規接続
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._is_healthy(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """接続を返却（未完了のトランザクションはロールバック、壊れた接続は破棄）"""
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+
+            self._last_used[id(conn)] = time.monotonic()
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        """アイドル接続をすべて閉じる"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+@st.cache_resource
+def get_pool():
+    """全セッション共有の接続プールを取得（プロセスごとに1つだけ生成）"""
+    db_config = st.secrets["database"]
+    return ConnectionPool(
+        db_config["url"],
+        min_size=int(db_config.get("pool_min_size", DEFAULT_POOL_MIN_SIZE)),
+        max_size=int(db_config.get("pool_max_size", DEFAULT_POOL_MAX_SIZE)),
+        timeout=float(db_config.get("pool_timeout", DEFAULT_POOL_TIMEOUT)),
+        health_check_interval=float(db_config.get("health_check_interval", DEFAULT_HEALTH_CHECK_INTERVAL)),
+    )
+
+
+@contextmanager
 def get_connection():
-    """データベース接続を取得"""
-    conn = psycopg2.connect(st.secrets["database"]["url"])
-    return conn
+    """データベース接続をプールから取得（with ブロック終了時に返却）"""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+class QueryCache:
+    """検索結果のTTL付きキャッシュ
+
+    見積の保存・削除時に invalidate() で全体を無効化する。
+    無効化と並行して実行されていた検索の結果は、古い可能性があるため保存しない。
+    """
+
+    def __init__(self, ttl=DEFAULT_QUERY_CACHE_TTL, max_entries=DEFAULT_QUERY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """キャッシュがあれば返し、なければ loader() の結果を保存して返す"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    @property
+    def generation(self):
+        """見積の保存・削除のたびに増える世代番号（作成済みの出力が古くなったかの判定に使う）"""
+        return self._generation
+
+    def invalidate(self):
+        """キャッシュを全て破棄"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """ヒット数・ミス数などの統計を取得"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+@st.cache_resource
+def get_query_cache():
+    """全セッション共有の検索結果キャッシュを取得"""
+    db_config = st.secrets["database"]
+    return QueryCache(
+        ttl=float(db_config.get("query_cache_ttl", DEFAULT_QUERY_CACHE_TTL)),
+        max_entries=int(db_config.get("query_cache_max_entries", DEFAULT_QUERY_CACHE_MAX_ENTRIES)),
+    )
+
+
+def _search_cache_key(kind, keyword, start_date, end_date, staff, *extra):
+    """検索条件を正規化してキャッシュキーを作成"""
+    keyword = keyword.strip() if keyword else None
+    return (
+        kind,
+        keyword or None,
+        str(start_date) if start_date else None,
+        str(end_date) if end_date else None,
+        staff or None,
+    ) + extra
 
 
 def init_db():
     """データベースの初期化（テーブル作成）"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quotes (
+                id SERIAL PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT NOW(),
+                quote_date DATE NOT NULL,
+                recipient TEXT NOT NULL,
+                retailer TEXT,
+                staff TEXT NOT NULL,
+                sales_area TEXT NOT NULL,
+                products_json TEXT NOT NULL,
+                notes TEXT,
+                pdf_filename TEXT
+            )
+        """)
+
+        # 履歴のキーセットページング（created_at DESC, id DESC）用インデックス
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quotes_created_at_id
+            ON quotes (created_at DESC, id DESC)
+        """)
+
+        # 絞り込み用インデックス（created_at は上の複合インデックスで対応）
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quotes_quote_date
+            ON quotes (quote_date)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quotes_staff
+            ON quotes (staff, created_at DESC, id DESC)
+        """)
+
+        _create_trigram_indexes(cursor)
+
+        # 作成済みPDF（見積入力のハッシュ単位で1つだけ保存し、同一内容の見積で共有）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quote_pdfs (
+                content_hash TEXT PRIMARY KEY,
+                pdf_data BYTEA NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        cursor.execute("ALTER TABLE quotes ADD COLUMN IF NOT EXISTS pdf_hash TEXT")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quotes_pdf_hash
+            ON quotes (pdf_hash)
+        """)
+
+        # 見積明細（商品ごとの行）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quote_items (
+                id SERIAL PRIMARY KEY,
+                quote_id INTEGER NOT NULL REFERENCES quotes(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                jan TEXT,
+                short_name TEXT,
+                order_lot TEXT,
+                wholesale_price INTEGER,
+                special_condition TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quote_items_quote_id
+            ON quote_items (quote_id, position)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quote_items_jan
+            ON quote_items (jan, order_lot)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quote_items_short_name
+            ON quote_items (short_name)
+        """)
+
+        backfill_quote_items(cursor)
+
+        conn.commit()
+        cursor.close()
+
+
+def _create_trigram_indexes(cursor):
+    """送付先・対象小売のキーワード検索用に pg_trgm の GIN インデックスを作成
+
+    部分一致（ILIKE）・あいまい一致（<%）のどちらも同じ gin_trgm_ops の索引で検索できる。
+    拡張機能が使えない環境（権限不足など）では作成をスキップし、
+    検索は ILIKE による逐次比較で動作する。
+    """
+    global TRIGRAM_SEARCH_ENABLED
+
+    cursor.execute("SAVEPOINT create_trigram_indexes")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quotes_recipient_trgm
+            ON quotes USING gin (recipient gin_trgm_ops)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_quotes_retailer_trgm
+            ON quotes USING gin (retailer gin_trgm_ops)
+        """)
+        cursor.execute("RELEASE SAVEPOINT create_trigram_indexes")
+        TRIGRAM_SEARCH_ENABLED = True
+    except psycopg2.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT create_trigram_indexes")
+        TRIGRAM_SEARCH_ENABLED = False
+
+
+def backfill_quote_items(cursor):
+    """quote_items が未作成の既存見積について products_json から明細を生成
+
+    JSONの展開はDB側で行うため、見積件数が多くてもPython側の負荷は増えない。
+    明細を持つ見積はスキップするので、何度実行しても結果は変わらない。
+    """
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS quotes (
-            id SERIAL PRIMARY KEY,
-            created_at TIMESTAMP DEFAULT NOW(),
-            quote_date DATE NOT NULL,
-            recipient TEXT NOT NULL,
-            retailer TEXT,
-            staff TEXT NOT NULL,
-            sales_area TEXT NOT NULL,
-            products_json TEXT NOT NULL,
-            notes TEXT,
-            pdf_filename TEXT
+        INSERT INTO quote_items
+            (quote_id, position, jan, short_name, order_lot, wholesale_price, special_condition)
+        SELECT
+            q.id,
+            item.position,
+            item.product->>'jan',
+            item.product->>'short_name',
+            item.product->>'order_lot',
+            NULLIF(item.product->>'wholesale_price', '')::numeric::integer,
+            item.product->>'special_condition'
+        FROM quotes q
+        CROSS JOIN LATERAL jsonb_array_elements(q.products_json::jsonb)
+            WITH ORDINALITY AS item(product, position)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM quote_items qi WHERE qi.quote_id = q.id
         )
     """)
+    return cursor.rowcount
+
+
+def _insert_quote_items(cursor, quote_id, products):
+    """見積明細を1回のバッチINSERTで保存"""
+    rows = [
+        (
+            quote_id,
+            position,
+            p.get('jan'),
+            p.get('short_name'),
+            p.get('order_lot'),
+            p.get('wholesale_price'),
+            p.get('special_condition'),
+        )
+        for position, p in enumerate(products, start=1)
+    ]
+    if not rows:
+        return
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO quote_items
+            (quote_id, position, jan, short_name, order_lot, wholesale_price, special_condition)
+        VALUES %s
+    """, rows)
 
-def save_quote(quote_date, recipient, retailer, staff, sales_area, products, notes=""):
-    """見積データを保存"""
-    conn = get_connection()
-    cursor = conn.cursor()
 
+def _store_quote_pdf(cursor, pdf_hash, pdf_data):
+    """PDFを保存（同じハッシュのPDFが保存済みなら何もしない）"""
     cursor.execute("""
-        INSERT INTO quotes (quote_date, recipient, retailer, staff, sales_area, products_json, notes)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        RETURNING id
-    """, (
-        quote_date,
-        recipient,
-        retailer,
-        staff,
-        sales_area,
-        json.dumps(products, ensure_ascii=False),
-        notes
-    ))
-
-    quote_id = cursor.fetchone()[0]
-    conn.commit()
-    cursor.close()
-    conn.close()
-
+        INSERT INTO quote_pdfs (content_hash, pdf_data)
+        VALUES (%s, %s)
+        ON CONFLICT (content_hash) DO NOTHING
+    """, (pdf_hash, psycopg2.Binary(pdf_data)))
+
+
+def save_quote(quote_date, recipient, retailer, staff, sales_area, products, notes="",
+               pdf_data=None, pdf_hash=None, pdf_filename=None):
+    """見積データを保存
+
+    pdf_data と pdf_hash（見積入力のハッシュ）を渡すと、作成したPDFも合わせて保存する。
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        if pdf_data is not None:
+            _store_quote_pdf(cursor, pdf_hash, pdf_data)
+        else:
+            pdf_hash = None
+
+        cursor.execute("""
+            INSERT INTO quotes (quote_date, recipient, retailer, staff, sales_area, products_json, notes,
+                                pdf_filename, pdf_hash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (
+            quote_date,
+            recipient,
+            retailer,
+            staff,
+            sales_area,
+            json.dumps(products, ensure_ascii=False),
+            notes,
+            pdf_filename,
+            pdf_hash
+        ))
+
+        quote_id = cursor.fetchone()[0]
+        _insert_quote_items(cursor, quote_id, products)
+
+        conn.commit()
+        cursor.close()
+
+    get_query_cache().invalidate()
     return quote_id
 
 
+def attach_quote_pdf(quote_id, pdf_hash, pdf_data, pdf_filename=None):
+    """既存の見積にPDFを紐付けて保存（PDF未保存の過去見積を再生成したときに使用）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        _store_quote_pdf(cursor, pdf_hash, pdf_data)
+        cursor.execute("""
+            UPDATE quotes
+            SET pdf_hash = %s, pdf_filename = COALESCE(%s, pdf_filename)
+            WHERE id = %s
+        """, (pdf_hash, pdf_filename, quote_id))
+
+        conn.commit()
+        cursor.close()
+
+
+def get_quote_pdf(quote_id):
+    """見積に紐付く保存済みPDFを取得（未保存の場合は None）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.pdf_data
+            FROM quotes q
+            JOIN quote_pdfs p ON p.content_hash = q.pdf_hash
+            WHERE q.id = %s
+        """, (quote_id,))
+        row = cursor.fetchone()
+        cursor.close()
+
+    if row:
+        return bytes(row[0])
+    return None
+
+
+def _row_to_quote(row):
+    """DBの行を見積データ（dict）に変換"""
+    quote = dict(row)
+    quote['products'] = json.loads(quote['products_json'])
+    if quote.get('created_at'):
+        quote['created_at'] = quote['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    if quote.get('quote_date'):
+        quote['quote_date'] = str(quote['quote_date'])
+    return quote
+
+
 def get_all_quotes():
     """全ての見積履歴を取得"""
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    with get_connection() as conn:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    cursor.execute("""
-        SELECT * FROM quotes ORDER BY created_at DESC
-    """)
-
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        cursor.execute("""
+            SELECT * FROM quotes ORDER BY created_at DESC
+        """)
 
-    quotes = []
-    for row in rows:
-        quote = dict(row)
-        quote['products'] = json.loads(quote['products_json'])
-        # created_atを文字列に変換
-        if quote.get('created_at'):
-            quote['created_at'] = quote['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        if quote.get('quote_date'):
-            quote['quote_date'] = str(quote['quote_date'])
-        quotes.append(quote)
+        rows = cursor.fetchall()
+        cursor.close()
 
-    return quotes
+    return [_row_to_quote(row) for row in rows]
 
 
 def get_quote_by_id(quote_id):
     """IDで見積を取得"""
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    with get_connection() as conn:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    cursor.execute("SELECT * FROM quotes WHERE id = %s", (quote_id,))
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
+        cursor.execute("SELECT * FROM quotes WHERE id = %s", (quote_id,))
+        row = cursor.fetchone()
+        cursor.close()
 
     if row:
-        quote = dict(row)
-        quote['products'] = json.loads(quote['products_json'])
-        if quote.get('created_at'):
-            quote['created_at'] = quote['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        if quote.get('quote_date'):
-            quote['quote_date'] = str(quote['quote_date'])
-        return quote
+        return _row_to_quote(row)
     return None
 
 
 def delete_quote(quote_id):
     """見積を削除"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("DELETE FROM quotes WHERE id = %s", (quote_id,))
+        cursor.execute("DELETE FROM quotes WHERE id = %s RETURNING pdf_hash", (quote_id,))
+        row = cursor.fetchone()
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        # どの見積からも参照されなくなったPDFを削除
+        if row and row[0]:
+            cursor.execute("""
+                DELETE FROM quote_pdfs p
+                WHERE p.content_hash = %s
+                  AND NOT EXISTS (SELECT 1 FROM quotes q WHERE q.pdf_hash = p.content_hash)
+            """, (row[0],))
 
+        conn.commit()
+        cursor.close()
 
-def search_quotes(keyword=None, start_date=None, end_date=None, staff=None):
-    """見積を検索"""
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    get_query_cache().invalidate()
+
+
+def _escape_like(text):
+    """LIKE パターン用に特殊文字（\\ % _）をエスケープ"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
-    query = "SELECT * FROM quotes WHERE 1=1"
+
+def _build_search_conditions(keyword=None, start_date=None, end_date=None, staff=None):
+    """検索条件から WHERE 句とパラメータを組み立てる"""
+    query = " WHERE 1=1"
     params = []
 
+    keyword = keyword.strip() if keyword else None
     if keyword:
-        query += " AND (recipient LIKE %s OR retailer LIKE %s)"
-        params.extend([f"%{keyword}%", f"%{keyword}%"])
+        # 部分一致（ワイルドカード文字はエスケープ）
+        pattern = "%" + _escape_like(keyword) + "%"
+        if TRIGRAM_SEARCH_ENABLED and len(keyword) >= MIN_TRIGRAM_KEYWORD_LENGTH:
+            # トライグラム索引で部分一致と表記ゆれ（あいまい一致）の両方を検索。
+            # あいまい一致は文字列全体の similarity（%）ではなく、社名の一部分との
+            # word_similarity（<%）で比べる（短いキーワードと長い社名全体では閾値に届かないため）
+            query += (" AND (recipient ILIKE %s OR retailer ILIKE %s"
+                      " OR %s <%% recipient OR %s <%% retailer)")
+            params.extend([pattern, pattern, keyword, keyword])
+        else:
+            query += " AND (recipient ILIKE %s OR retailer ILIKE %s)"
+            params.extend([pattern, pattern])
 
     if start_date:
         query += " AND quote_date >= %s"
@@ -150,24 +601,180 @@ def search_quotes(keyword=None, start_date=None, end_date=None, staff=None):
         query += " AND staff = %s"
         params.append(staff)
 
-    query += " ORDER BY created_at DESC"
+    return query, params
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
 
-    quotes = []
+def search_quotes(keyword=None, start_date=None, end_date=None, staff=None):
+    """見積を検索"""
+    where, params = _build_search_conditions(keyword, start_date, end_date, staff)
+    query = "SELECT * FROM quotes" + where + " ORDER BY created_at DESC"
+
+    with get_connection() as conn:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+
+    return [_row_to_quote(row) for row in rows]
+
+
+def search_quote_summaries(keyword=None, start_date=None, end_date=None, staff=None,
+                           cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """見積の一覧表示用の概要を1ページ分だけ検索（キーセットページング）
+
+    一覧の見出しに必要な列だけを取得し、products_json・notes は読み込まない。
+    詳細は get_quote_by_id で個別に取得する。結果は検索結果キャッシュに保存される。
+
+    cursor には前ページの戻り値 next_cursor（(created_at, id) のタプル）を渡す。
+    None の場合は先頭ページを返す。
+    戻り値: (summaries, next_cursor) ※次ページがなければ next_cursor は None
+    """
+    key = _search_cache_key(
+        'summaries', keyword, start_date, end_date, staff,
+        tuple(cursor) if cursor else None, page_size,
+    )
+    return get_query_cache().get_or_load(
+        key,
+        lambda: _fetch_quote_summaries(keyword, start_date, end_date, staff, cursor, page_size),
+    )
+
+
+def _fetch_quote_summaries(keyword, start_date, end_date, staff, cursor, page_size):
+    """見積の概要1ページ分をDBから取得"""
+    where, params = _build_search_conditions(keyword, start_date, end_date, staff)
+
+    if cursor:
+        where += " AND (created_at, id) < (%s::timestamp, %s)"
+        params.extend(cursor)
+
+    # 1件多く取得して次ページの有無を判定
+    query = (
+        "SELECT id, created_at, quote_date, recipient, retailer, staff FROM quotes"
+        + where + " ORDER BY created_at DESC, id DESC LIMIT %s"
+    )
+    params.append(page_size + 1)
+
+    with get_connection() as conn:
+        db_cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+        db_cursor.close()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = (last['created_at'].isoformat(), last['id'])
+
+    summaries = []
     for row in rows:
-        quote = dict(row)
-        quote['products'] = json.loads(quote['products_json'])
-        if quote.get('created_at'):
-            quote['created_at'] = quote['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        if quote.get('quote_date'):
-            quote['quote_date'] = str(quote['quote_date'])
-        quotes.append(quote)
-
-    return quotes
+        summary = dict(row)
+        summary['created_at'] = summary['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+        summary['quote_date'] = str(summary['quote_date'])
+        summaries.append(summary)
+
+    return summaries, next_cursor
+
+
+def count_quotes(keyword=None, start_date=None, end_date=None, staff=None):
+    """検索条件に一致する見積の件数を取得（検索結果キャッシュを利用）"""
+    key = _search_cache_key('count', keyword, start_date, end_date, staff)
+    return get_query_cache().get_or_load(
+        key,
+        lambda: _fetch_quote_count(keyword, start_date, end_date, staff),
+    )
+
+
+def _fetch_quote_count(keyword, start_date, end_date, staff):
+    """検索条件に一致する見積の件数をDBから取得"""
+    where, params = _build_search_conditions(keyword, start_date, end_date, staff)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM quotes" + where, params)
+        count = cursor.fetchone()[0]
+        cursor.close()
+
+    return count
+
+
+def iter_quote_items_for_export(keyword=None, start_date=None, end_date=None, staff=None,
+                                batch_size=EXPORT_BATCH_SIZE):
+    """CSV出力用に見積の明細をサーバーサイドカーソルで少しずつ取得
+
+    明細1件1行（縦持ち）の行を batch_size 行ずつのリストで返す。各行は
+    (見積ID, 対象小売, 送付先, 日付, 担当者, 短縮名, ロット, 卸価格, 特別条件) のタプルで、
+    見積の作成日時の新しい順・明細の順に並ぶ（明細のない見積は短縮名以降が None の1行）。
+    1件の見積の明細が2つのリストにまたがることもある。dict に変換せずに返すので、
+    csv_export.write_quotes_csv で列ごとにまとめて処理する。
+    """
+    where, params = _build_search_conditions(keyword, start_date, end_date, staff)
+    query = """
+        SELECT q.id, q.retailer, q.recipient, q.quote_date, q.staff,
+               qi.short_name, qi.order_lot, qi.wholesale_price, qi.special_condition
+        FROM (
+            SELECT id, created_at, retailer, recipient, quote_date, staff
+            FROM quotes""" + where + """
+        ) q
+        LEFT JOIN quote_items qi ON qi.quote_id = q.id
+        ORDER BY q.created_at DESC, q.id DESC, qi.position
+    """
+
+    with get_connection() as conn:
+        cursor = conn.cursor(name="quotes_export")
+        cursor.execute(query, params)
+
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def search_quote_ids(keyword=None, start_date=None, end_date=None, staff=None):
+    """検索条件に一致する見積のIDを作成日時の新しい順に取得"""
+    where, params = _build_search_conditions(keyword, start_date, end_date, staff)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM quotes" + where + " ORDER BY created_at DESC, id DESC", params)
+        ids = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+
+    return ids
+
+
+def iter_quotes_with_pdf(quote_ids, batch_size=PDF_BATCH_SIZE):
+    """PDF一括出力用に見積と保存済みPDFをサーバーサイドカーソルで少しずつ取得
+
+    (見積, PDFデータ) のタプルを quote_ids の順に1件ずつ返す（PDF未保存の見積は None）。
+    存在しないIDは返さない。
+    """
+    if not quote_ids:
+        return
+
+    query = """
+        SELECT q.*, p.pdf_data
+        FROM unnest(%s::integer[]) WITH ORDINALITY AS ids(id, ord)
+        JOIN quotes q ON q.id = ids.id
+        LEFT JOIN quote_pdfs p ON p.content_hash = q.pdf_hash
+        ORDER BY ids.ord
+    """
+
+    with get_connection() as conn:
+        cursor = conn.cursor(name="quotes_pdf_export", cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.itersize = batch_size
+        cursor.execute(query, (list(quote_ids),))
+
+        try:
+            for row in cursor:
+                pdf_data = row.pop('pdf_data')
+                yield _row_to_quote(row), (bytes(pdf_data) if pdf_data is not None else None)
+        finally:
+            cursor.close()
 
 
 # 初期化を実行
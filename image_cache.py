@@ -0,0 +1,243 @@
+# 画像キャッシュモジュール（PDF埋め込み用・画面表示用の縮小画像、画像マニフェスト）
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from PIL import Image as PILImage
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+
+# 画像フォルダのパス（Streamlit Cloud対応）
+IMAGE_FOLDER = Path(__file__).parent / "images"
+
+# 縮小画像の保存先
+CACHE_FOLDER = Path(__file__).parent / ".cache" / "images"
+
+# PDF印刷用の解像度
+PDF_IMAGE_DPI = 300
+
+POINTS_PER_INCH = 72
+
+# PDF上の画像表示枠（ポイント単位）
+PRODUCT_IMAGE_BOX = (10*mm, 10*mm)
+LOGO_FILENAME = "2foods_logo.png"
+LOGO_IMAGE_BOX = (50*mm, 15*mm)
+
+# 画面表示用の縮小画像の色数（表示幅の PNG を256色に減色して転送量を減らす）
+# st.image は表示幅以下の PNG をそのまま /media の URL で配信するため、ブラウザにキャッシュされる。
+# 表示幅より大きい画像や WebP は st.image が毎回 PNG/JPEG に変換し直すので使わない
+UI_THUMBNAIL_COLORS = 256
+
+# 画像フォルダの変更を確認する間隔（秒）
+MANIFEST_REFRESH_INTERVAL = 30
+
+# メモリ上のキャッシュ: (ファイル名, 幅px, 高さpx, 色数) -> (元画像の更新時刻, 縮小画像のパス)
+_thumbnail_cache = {}
+_thumbnail_lock = threading.Lock()
+
+
+def fit_size(orig_width, orig_height, max_width, max_height):
+    """縦横比を維持して max_width × max_height に収まるサイズを計算"""
+    ratio = min(max_width / orig_width, max_height / orig_height)
+    return orig_width * ratio, orig_height * ratio
+
+
+def _create_thumbnail(source_path, target_path, max_px_width, max_px_height, colors=None):
+    """縮小画像（PNG）を作成して保存（元画像より大きくはしない）
+
+    max_px_height が None の場合は幅だけを制限し、高さは縦横比どおりにする。
+    colors を指定した場合はその色数に減色する。
+    """
+    with PILImage.open(source_path) as img:
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        if max_px_height is None:
+            max_px_height = max(1, round(img.height * max_px_width / img.width))
+        img.thumbnail((max_px_width, max_px_height), PILImage.LANCZOS)
+        if colors is not None:
+            img = img.convert("RGBA").quantize(colors, method=PILImage.FASTOCTREE)
+
+        # 書き込み途中のファイルを読まれないよう、一時ファイルに保存してから置き換える
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(f"{target_path.name}.{os.getpid()}.tmp")
+        img.save(tmp_path, format="PNG", optimize=True)
+        os.replace(tmp_path, target_path)
+
+
+def _get_thumbnail(image_filename, max_px_width, max_px_height=None, colors=None):
+    """縮小画像のパスを取得（元画像の更新時刻をキーにディスクとメモリにキャッシュ）
+
+    max_px_height が None の場合は幅だけを制限する。
+    縮小画像を作成できない場合は元画像のパスを返す。画像がない場合は None。
+    """
+    source_path = IMAGE_FOLDER / image_filename
+    try:
+        mtime_ns = source_path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+    key = (image_filename, max_px_width, max_px_height, colors)
+    suffix = ".png"
+
+    with _thumbnail_lock:
+        cached = _thumbnail_cache.get(key)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+
+        size = f"{max_px_width}w" if max_px_height is None else f"{max_px_width}x{max_px_height}"
+        prefix = f"{source_path.stem}_{size}{f'_{colors}c' if colors else ''}_"
+        target_path = CACHE_FOLDER / f"{prefix}{mtime_ns}{suffix}"
+        if not target_path.exists():
+            try:
+                _create_thumbnail(source_path, target_path, max_px_width, max_px_height, colors)
+            except (OSError, ValueError):
+                return source_path
+
+            # 元画像が差し替えられる前の古い縮小画像を削除
+            for old_path in CACHE_FOLDER.glob(f"{prefix}*{suffix}"):
+                if old_path != target_path:
+                    old_path.unlink(missing_ok=True)
+
+        _thumbnail_cache[key] = (mtime_ns, target_path)
+        return target_path
+
+
+def get_pdf_thumbnail(image_filename, max_width, max_height, dpi=PDF_IMAGE_DPI):
+    """PDFの表示サイズ（ポイント単位）に合わせた印刷解像度の縮小画像パスを取得
+
+    元画像の更新時刻をキーにディスクとメモリにキャッシュする。
+    縮小画像を作成できない場合は元画像のパスを返す。画像がない場合は None。
+    """
+    max_px_width = round(max_width / POINTS_PER_INCH * dpi)
+    max_px_height = round(max_height / POINTS_PER_INCH * dpi)
+    return _get_thumbnail(image_filename, max_px_width, max_px_height)
+
+
+def get_ui_thumbnail(image_filename, display_width):
+    """画面表示用の縮小画像（表示幅・256色の PNG）のパスを取得（高さは縦横比どおり）
+
+    st.image(パス, width=display_width, output_format="PNG") に渡すと、変換されずにそのまま配信される。
+    画像がない場合は None。縮小画像を作成できない場合は元画像のパスを返す。
+    """
+    return _get_thumbnail(image_filename, display_width, colors=UI_THUMBNAIL_COLORS)
+
+
+class ImageManifest:
+    """images フォルダの画像情報を保持するマニフェスト
+
+    画像ごとに元サイズ・チェックサム・表示枠に収めたサイズ・縮小画像の
+    ImageReader を事前に用意し、PDF生成時にファイルを開いたりデコードしたりしない。
+    フォルダの変更は MANIFEST_REFRESH_INTERVAL 秒ごとに確認し、
+    更新された画像だけ作り直す。
+    """
+
+    def __init__(self, folder=IMAGE_FOLDER, refresh_interval=MANIFEST_REFRESH_INTERVAL):
+        self.folder = Path(folder)
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._fingerprint = ""
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self, image_filename):
+        """画像情報を取得（存在しない場合は None）"""
+        self._refresh_if_due()
+        return self._entries.get(image_filename)
+
+    def entries(self):
+        """全画像の情報を取得"""
+        self._refresh_if_due()
+        return dict(self._entries)
+
+    def fingerprint(self):
+        """全画像のファイル名・チェックサムから作ったハッシュ（画像が変わると値が変わる）"""
+        self._refresh_if_due()
+        return self._fingerprint
+
+    def _refresh_if_due(self):
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.refresh_interval:
+            return
+
+        with self._lock:
+            checked_at = self._checked_at
+            if checked_at is not None and time.monotonic() - checked_at < self.refresh_interval:
+                return
+            self.refresh()
+            self._checked_at = time.monotonic()
+
+    def refresh(self):
+        """フォルダを走査してマニフェストを更新（変更のない画像は再利用）"""
+        entries = {}
+        try:
+            paths = sorted(self.folder.glob("*.png"))
+        except OSError:
+            paths = []
+
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+
+            entry = self._entries.get(path.name)
+            if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['file_size'] != stat.st_size:
+                try:
+                    entry = self._build_entry(path, stat)
+                except (OSError, ValueError):
+                    continue
+            entries[path.name] = entry
+
+        digest = hashlib.sha256()
+        for name, entry in entries.items():
+            digest.update(f"{name}:{entry['checksum']}\n".encode('utf-8'))
+
+        # 参照中の呼び出し元が途中状態を見ないよう、まとめて差し替える
+        self._entries = entries
+        self._fingerprint = digest.hexdigest()
+
+    def _build_entry(self, path, stat):
+        with PILImage.open(path) as img:
+            width, height = img.size
+
+        with open(path, "rb") as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+
+        box = LOGO_IMAGE_BOX if path.name == LOGO_FILENAME else PRODUCT_IMAGE_BOX
+        display_width, display_height = fit_size(width, height, *box)
+        thumbnail_path = get_pdf_thumbnail(path.name, *box) or path
+
+        # デコード済みの画素データを保持させておく（PDF生成時にデコードしない）
+        thumbnail_reader = ImageReader(str(thumbnail_path))
+        thumbnail_reader.getRGBData()
+
+        return {
+            'path': path,
+            'mtime_ns': stat.st_mtime_ns,
+            'file_size': stat.st_size,
+            'width': width,
+            'height': height,
+            'checksum': checksum,
+            'box': box,
+            'display_width': display_width,
+            'display_height': display_height,
+            'thumbnail_path': thumbnail_path,
+            'thumbnail_reader': thumbnail_reader,
+        }
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_image_manifest():
+    """プロセス共通の画像マニフェストを取得（初回呼び出し時に作成）"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = ImageManifest()
+    return _manifest
@@ -0,0 +1,186 @@
+# バックグラウンドジョブモジュール
+#
+# 見積書のPDF生成と履歴保存を Streamlit のスクリプトスレッドの外（共有スレッドプール）で実行する。
+# ジョブはセッション状態に保持し、画面の再実行（rerun）をまたいで結果を受け取る。
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import save_quote, attach_quote_pdf, delete_quote
+from pdf_generator import generate_pdf, get_quote_hash
+
+# 全セッションで共有するワーカースレッド数
+MAX_JOB_WORKERS = 4
+
+# 1セッションが同時に実行できるジョブ数（1人がワーカーを占有しないため）
+MAX_ACTIVE_JOBS_PER_SESSION = 1
+
+
+class JobLimitError(Exception):
+    """セッションの同時実行ジョブ数の上限を超えた"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor():
+    """プロセス共通のジョブ用スレッドプールを取得（初回呼び出し時に作成）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_JOB_WORKERS, thread_name_prefix="quote-job")
+    return _executor
+
+
+# セッションごとの実行中ジョブ数
+_active_jobs = {}
+_active_lock = threading.Lock()
+
+
+def _acquire_slot(owner):
+    with _active_lock:
+        active = _active_jobs.get(owner, 0)
+        if active >= MAX_ACTIVE_JOBS_PER_SESSION:
+            raise JobLimitError("実行中の処理があります。完了までお待ちください")
+        _active_jobs[owner] = active + 1
+
+
+def _release_slot(owner):
+    with _active_lock:
+        active = _active_jobs.get(owner, 0) - 1
+        if active > 0:
+            _active_jobs[owner] = active
+        else:
+            _active_jobs.pop(owner, None)
+
+
+class QuoteJob:
+    """見積書作成ジョブ（PDF生成と履歴保存を並行して行い、最後にPDFを見積に紐付ける）"""
+
+    STEPS = ("PDF作成", "履歴保存", "PDF保存")
+
+    def __init__(self, owner, pdf_inputs, pdf_filename):
+        self.owner = owner
+        self.pdf_inputs = pdf_inputs
+        self.pdf_filename = pdf_filename
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+        self.pdf_data = None
+        self.quote_id = None
+        self.error = None
+        self.warning = None   # 見積は保存できたがPDFの保存に失敗した場合など
+        self.completed_steps = []
+
+        self._lock = threading.Lock()
+        self._pending = 2     # PDF作成・履歴保存
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def succeeded(self):
+        return self.done and self.error is None
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def progress(self):
+        """進捗（0.0〜1.0）"""
+        return len(self.completed_steps) / len(self.STEPS)
+
+    @property
+    def current_step(self):
+        """実行中の工程名"""
+        if self._pending:
+            return "・".join(step for step in self.STEPS[:2] if step not in self.completed_steps)
+        return self.STEPS[2]
+
+    def wait(self, timeout=None):
+        """ジョブの完了を待つ（完了したら True）"""
+        return self._done.wait(timeout)
+
+    def _start(self, executor):
+        executor.submit(self._run_step, "PDF作成", self._render)
+        executor.submit(self._run_step, "履歴保存", self._save)
+
+    def _render(self):
+        self.pdf_data = generate_pdf(**self.pdf_inputs)
+
+    def _save(self):
+        inputs = self.pdf_inputs
+        self.quote_id = save_quote(
+            quote_date=inputs['quote_date'],
+            recipient=inputs['recipient'],
+            retailer=inputs['retailer'],
+            staff=inputs['staff'],
+            sales_area=inputs['sales_area'],
+            products=inputs['products'],
+            notes=inputs['notes'],
+            pdf_filename=self.pdf_filename,
+        )
+
+    def _attach(self):
+        attach_quote_pdf(self.quote_id, get_quote_hash(**self.pdf_inputs), self.pdf_data, self.pdf_filename)
+
+    def _run_step(self, step, func):
+        try:
+            func()
+        except Exception as e:
+            with self._lock:
+                if self.error is None:
+                    self.error = f"{step}に失敗しました: {e}"
+        else:
+            with self._lock:
+                self.completed_steps.append(step)
+
+        with self._lock:
+            self._pending -= 1
+            last = self._pending == 0
+        if last:
+            self._after_parallel_steps()
+
+    def _after_parallel_steps(self):
+        """PDF作成・履歴保存の両方が終わったら、PDFを見積に紐付けて完了にする"""
+        if self.error is None:
+            try:
+                self._attach()
+            except Exception as e:
+                # 見積とPDFはできているので完了扱い（履歴画面で再生成すれば保存される）
+                self.warning = f"PDFの履歴への保存に失敗しました: {e}"
+            else:
+                self.completed_steps.append("PDF保存")
+        elif self.quote_id is not None:
+            # PDFを作成できなかった見積は履歴に残さない（同期処理だった頃と同じ結果にする）
+            try:
+                delete_quote(self.quote_id)
+            except Exception:
+                pass
+            self.quote_id = None
+
+        self.finished_at = time.monotonic()
+        _release_slot(self.owner)
+        self._done.set()
+
+
+def submit_quote_job(owner, pdf_inputs, pdf_filename):
+    """見積書作成ジョブを開始（owner はセッションを区別するキー）
+
+    同じ owner の実行中ジョブが MAX_ACTIVE_JOBS_PER_SESSION 件に達している場合は JobLimitError。
+    """
+    _acquire_slot(owner)
+    job = QuoteJob(owner, pdf_inputs, pdf_filename)
+    try:
+        job._start(get_job_executor())
+    except Exception:
+        _release_slot(owner)
+        raise
+    return job
@@ -0,0 +1,362 @@
+# マスタデータモジュール
+#
+# 商品マスタ・2Waterのロット別価格・価格改定履歴・送付先・担当者・販売エリアを外部ファイル（JSON/CSV）から読み込む。
+# ファイルの更新日時が変わったら読み込み直し、検証に通った場合だけ丸ごと差し替える（再起動は不要）。
+# ファイルがない場合・読み込めない場合は products.py のデータを使う。
+
+import csv
+import json
+import threading
+from datetime import date
+from pathlib import Path
+
+import products
+from price_book import NO_LOT, PriceBook
+from product_catalog import PRODUCT_FIELDS, ProductCatalog
+
+# マスタファイルの候補（先に見つかったものを使う）
+#   JSON: 全データ（"products", "water_lot_patterns", "price_history", "recipients", "staff_list", "sales_areas"）
+#   CSV : 商品マスタのみ（1行目は項目名）。その他のデータは products.py のものを使う
+MASTER_DATA_PATHS = (
+    Path(__file__).parent / "master_data.json",
+    Path(__file__).parent / "master_data.csv",
+)
+
+# 数値の項目
+INT_FIELDS = ("retail_price", "wholesale_price", "shelf_life")
+
+# JSON の一覧データのキー
+LIST_SECTIONS = ("recipients", "staff_list", "sales_areas")
+
+
+class MasterDataError(ValueError):
+    """マスタファイルの内容が正しくない"""
+
+
+class MasterData:
+    """ある時点のマスタデータ一式（作成後は変更しない）
+
+    画面の1回の表示ではこのオブジェクトを1つだけ使うことで、途中で読み込み直しがあっても
+    古いデータと新しいデータが混ざらないようにする。
+    """
+
+    __slots__ = ('catalog', 'water_lot_patterns', 'price_book', 'recipients', 'staff_list', 'sales_areas',
+                 'source', 'version')
+
+    def __init__(self, catalog, water_lot_patterns, price_book, recipients, staff_list, sales_areas,
+                 source, version=0):
+        self.catalog = catalog
+        self.water_lot_patterns = water_lot_patterns
+        self.price_book = price_book
+        self.recipients = recipients
+        self.staff_list = staff_list
+        self.sales_areas = sales_areas
+        self.source = source      # 読み込んだファイルのパス（products.py の場合は None）
+        self.version = version    # 読み込み直すたびに増える番号（products.py は 0）
+
+    @property
+    def water_product(self):
+        """2Waterの商品（ない場合は None）"""
+        return next((product for product in self.catalog if product.is_water), None)
+
+
+def _require_int(value, label):
+    if isinstance(value, bool):
+        raise MasterDataError(f"{label}は整数で指定してください: {value!r}")
+    if isinstance(value, str):
+        try:
+            value = int(value.strip())
+        except ValueError:
+            raise MasterDataError(f"{label}は整数で指定してください: {value!r}") from None
+    if not isinstance(value, int) or value < 0:
+        raise MasterDataError(f"{label}は0以上の整数で指定してください: {value!r}")
+    return value
+
+
+def _require_str(value, label):
+    if not isinstance(value, str) or not value.strip():
+        raise MasterDataError(f"{label}を文字列で指定してください: {value!r}")
+    return value
+
+
+def _parse_bool(value, label):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("", "0", "false", "no"):
+        return False
+    if isinstance(value, str) and value.strip().lower() in ("1", "true", "yes"):
+        return True
+    raise MasterDataError(f"{label}は true/false で指定してください: {value!r}")
+
+
+def _validate_product(row, number):
+    """商品1件を検証して products.py と同じ形の dict に変換"""
+    if not isinstance(row, dict):
+        raise MasterDataError(f"商品{number}件目: 項目名と値の組で指定してください")
+    unknown = set(row) - set(PRODUCT_FIELDS) - {"is_water"}
+    if unknown:
+        raise MasterDataError(f"商品{number}件目: 未知の項目があります: {', '.join(sorted(unknown))}")
+
+    product = {}
+    for name in PRODUCT_FIELDS:
+        if name not in row:
+            raise MasterDataError(f"商品{number}件目: 項目 {name} がありません")
+        label = f"商品{number}件目の {name}"
+        if name in INT_FIELDS:
+            product[name] = _require_int(row[name], label)
+        else:
+            product[name] = _require_str(row[name], label)
+    if _parse_bool(row.get("is_water", False), f"商品{number}件目の is_water"):
+        product["is_water"] = True
+    return product
+
+
+def _validate_water_lot_patterns(rows):
+    if not isinstance(rows, list) or not rows:
+        raise MasterDataError("water_lot_patterns は1件以上のリストで指定してください")
+    patterns = []
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict) or set(row) != {"lot", "default_price"}:
+            raise MasterDataError(f"water_lot_patterns {number}件目: lot と default_price を指定してください")
+        patterns.append({
+            "lot": _require_str(row["lot"], f"water_lot_patterns {number}件目の lot"),
+            "default_price": _require_int(row["default_price"], f"water_lot_patterns {number}件目の default_price"),
+        })
+    lots = [pattern["lot"] for pattern in patterns]
+    if len(set(lots)) != len(lots):
+        raise MasterDataError("water_lot_patterns のロット名が重複しています")
+    return tuple(patterns)
+
+
+def _validate_price_history(rows, catalog):
+    """価格改定履歴を検証して (JAN, ロット, 適用開始日, 価格) の組のリストに変換
+
+    終売した商品の履歴も残せるよう、商品マスタにない JAN も受け付ける。
+    """
+    if not isinstance(rows, list):
+        raise MasterDataError("price_history はリストで指定してください")
+    entries = []
+    for number, row in enumerate(rows, 1):
+        label = f"price_history {number}件目"
+        if not isinstance(row, dict) or not {"jan", "effective_date", "wholesale_price"} <= set(row) \
+                or set(row) - {"jan", "lot", "effective_date", "wholesale_price"}:
+            raise MasterDataError(f"{label}: jan・effective_date・wholesale_price（2Waterは lot も）を指定してください")
+        jan = _require_str(row["jan"], f"{label}の jan")
+        product = catalog.by_jan(jan)
+        if product is not None and product.is_water:
+            lot = _require_str(row.get("lot"), f"{label}の lot")
+        else:
+            lot = row.get("lot") or NO_LOT
+        try:
+            effective_date = date.fromisoformat(_require_str(row["effective_date"], f"{label}の effective_date"))
+        except ValueError:
+            raise MasterDataError(f"{label}の effective_date は YYYY-MM-DD で指定してください: "
+                                  f"{row['effective_date']!r}") from None
+        price = _require_int(row["wholesale_price"], f"{label}の wholesale_price")
+        entries.append((jan, lot, effective_date, price))
+    return entries
+
+
+def _validate_names(values, section):
+    if not isinstance(values, list) or not values:
+        raise MasterDataError(f"{section} は1件以上のリストで指定してください")
+    names = tuple(_require_str(value, f"{section} の値") for value in values)
+    if len(set(names)) != len(names):
+        raise MasterDataError(f"{section} に重複があります")
+    return names
+
+
+def build_master_data(data, source=None, version=0):
+    """マスタデータの dict（JSON と同じ形）を検証して MasterData を作成
+
+    "products" 以外のキーは省略でき、省略したものは products.py のデータを使う。
+    """
+    if not isinstance(data, dict):
+        raise MasterDataError("マスタファイルの形式が正しくありません")
+    unknown = set(data) - {"products", "water_lot_patterns", "price_history"} - set(LIST_SECTIONS)
+    if unknown:
+        raise MasterDataError(f"未知のデータがあります: {', '.join(sorted(unknown))}")
+
+    rows = data.get("products")
+    if not isinstance(rows, list) or not rows:
+        raise MasterDataError("products は1件以上のリストで指定してください")
+    try:
+        catalog = ProductCatalog.from_dicts(
+            _validate_product(row, number) for number, row in enumerate(rows, 1)
+        )
+    except MasterDataError:
+        raise
+    except ValueError as e:
+        raise MasterDataError(str(e)) from None
+
+    water_lot_patterns = _validate_water_lot_patterns(
+        data.get("water_lot_patterns", products.WATER_LOT_PATTERNS)
+    )
+    if sum(1 for product in catalog if product.is_water) > 1:
+        raise MasterDataError("is_water の商品は1件までです")
+
+    price_history = _validate_price_history(data.get("price_history", products.PRICE_HISTORY), catalog)
+    try:
+        price_book = PriceBook.from_catalog(catalog, water_lot_patterns, price_history)
+    except ValueError as e:
+        raise MasterDataError(str(e)) from None
+
+    lists = {
+        section: _validate_names(data.get(section, getattr(products, section.upper())), section)
+        for section in LIST_SECTIONS
+    }
+    return MasterData(catalog, water_lot_patterns, price_book, source=source, version=version, **lists)
+
+
+def read_master_file(path):
+    """マスタファイル（JSON/CSV）を読み込んで dict（JSON と同じ形）を返す"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in (".json", ".csv"):
+        raise MasterDataError("対応していない形式です（.json または .csv）")
+    try:
+        if suffix == ".json":
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        # Excel で保存した BOM 付きのファイルも読めるよう utf-8-sig で開く
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+        raise MasterDataError(f"読み込めません: {e}") from None
+    for number, row in enumerate(rows, 1):
+        if None in row:
+            raise MasterDataError(f"商品{number}件目: 項目名より値の数が多い行があります")
+    return {"products": rows}
+
+
+def load_master_data(path, version=0):
+    """マスタファイルを読み込んで検証し、MasterData を作成"""
+    path = Path(path)
+    try:
+        return build_master_data(read_master_file(path), source=path, version=version)
+    except MasterDataError as e:
+        raise MasterDataError(f"{path.name}: {e}") from None
+
+
+def get_fallback_master_data():
+    """products.py のデータから MasterData を作成"""
+    water_lot_patterns = tuple(dict(pattern) for pattern in products.WATER_LOT_PATTERNS)
+    return MasterData(
+        products.CATALOG,
+        water_lot_patterns,
+        PriceBook.from_catalog(
+            products.CATALOG, water_lot_patterns,
+            _validate_price_history(products.PRICE_HISTORY, products.CATALOG),
+        ),
+        tuple(products.RECIPIENTS),
+        tuple(products.STAFF_LIST),
+        tuple(products.SALES_AREAS),
+        source=None,
+    )
+
+
+class MasterDataLoader:
+    """マスタファイルを更新日時で判定して読み込み直すローダー
+
+    get() はファイルの更新日時・サイズが前回と同じなら保持している MasterData をそのまま返す。
+    変わっていれば読み込み直し、検証に通った場合だけ差し替える。
+    読み込みに失敗した場合は直前のデータ（初回は products.py）を使い続け、error に理由を残す。
+    """
+
+    def __init__(self, paths=MASTER_DATA_PATHS):
+        self.paths = tuple(Path(path) for path in paths)
+        self._fallback = get_fallback_master_data()
+        self._current = self._fallback
+        self._key = None          # 読み込みを試したファイルの (パス, 更新日時, サイズ)
+        self._version = 0
+        self._lock = threading.Lock()
+        self.error = None         # 最後の読み込みエラー（成功したら None）
+        self.reloads = 0
+
+    def _stat(self):
+        for path in self.paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            return path, stat.st_mtime_ns, stat.st_size
+        return None
+
+    def get(self):
+        """現在のマスタデータを取得（ファイルが更新されていれば読み込み直す）"""
+        key = self._stat()
+        if key == self._key:
+            return self._current
+
+        with self._lock:
+            if key == self._key:
+                return self._current
+            if key is None:
+                # ファイルが削除された場合は products.py に戻す
+                self._current = self._fallback
+                self.error = None
+            else:
+                try:
+                    data = load_master_data(key[0], version=self._version + 1)
+                except MasterDataError as e:
+                    self.error = str(e)
+                else:
+                    self._version += 1
+                    self._current = data   # 検証済みの一式を1回の代入で差し替える
+                    self.error = None
+                    self.reloads += 1
+            self._key = key
+            return self._current
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_master_data_loader():
+    """プロセス共通のマスタデータローダーを取得（初回呼び出し時に作成）"""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = MasterDataLoader()
+    return _loader
+
+
+def get_master_data():
+    """現在のマスタデータを取得（マスタファイルが更新されていれば読み込み直す）"""
+    return get_master_data_loader().get()
+
+
+def export_master_json(path):
+    """products.py のデータをマスタファイル（JSON）に書き出す（外部ファイルへの移行用）"""
+    data = {
+        "products": products.CATALOG.to_dicts(),
+        "water_lot_patterns": products.WATER_LOT_PATTERNS,
+        "price_history": products.PRICE_HISTORY,
+        "recipients": products.RECIPIENTS,
+        "staff_list": products.STAFF_LIST,
+        "sales_areas": products.SALES_AREAS,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="マスタファイルの検証・書き出し")
+    parser.add_argument("path", help="マスタファイル（.json / .csv）")
+    parser.add_argument("--export", action="store_true", help="products.py のデータを JSON で書き出す")
+    args = parser.parse_args()
+
+    if args.export:
+        export_master_json(args.path)
+        print(f"{args.path} に書き出しました")
+    else:
+        master = load_master_data(args.path)
+        print(f"{args.path}: 商品 {len(master.catalog)}件 / 2Waterロット {len(master.water_lot_patterns)}件 / "
+              f"価格表 {len(master.price_book)}件 / "
+              f"送付先 {len(master.recipients)}件 / 担当者 {len(master.staff_list)}件 / "
+              f"販売エリア {len(master.sales_areas)}件")
@@ -1,55 +1,199 @@
 # PDF生成モジュール
 
+import copy
+import hashlib
 import io
+import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, Indenter
+from reportlab.platypus import (
+    BaseDocTemplate, PageTemplate, Frame, Table, TableStyle, Paragraph, Spacer, Image, Indenter, Flowable,
+)
+from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.pdfbase.ttfonts import TTFont
 from pathlib import Path
-from PIL import Image as PILImage
+
+from image_cache import get_image_manifest, fit_size, LOGO_FILENAME
 
 # 画像フォルダのパス（Streamlit Cloud対応）
 IMAGE_FOLDER = Path(__file__).parent / "images"
 
+# 画像を表示サイズに合わせた縮小版（300dpi）で埋め込むか（False で元画像をそのまま使用）
+USE_IMAGE_THUMBNAILS = True
+
+# PDFの描画方式（"platypus": SimpleDocTemplate でレイアウト、"canvas": 固定座標で直接描画）
+# canvas は platypus と見た目が一致することを tests/test_pdf_engines.py で確認している
+PDF_ENGINE = "canvas"
+
+# 決定的モード（作成日時・文書IDを固定し、同じ入力から常に同じバイト列のPDFを生成する）
+DETERMINISTIC_PDF = True
+
+# 見積書レイアウトの版（レイアウトを変更したら上げる。生成済みPDFのメモのキーに含める）
+TEMPLATE_VERSION = 2
+
+# 生成済みPDFのメモの上限（バイト数）
+PDF_MEMO_MAX_BYTES = 64 * 1024 * 1024
+
+# ページ設定（A4横、左右2mm・上下5mm マージン）
+PAGE_SIZE = landscape(A4)
+PAGE_MARGIN_X = 2*mm
+PAGE_MARGIN_Y = 5*mm
+FRAME_PADDING = 6  # フレーム内余白（pt、platypus の Frame の既定値）
+
+# 2ページ目以降の上部に入れる続きのヘッダー（送付先・日付）の高さと文字サイズ
+CONTINUED_HEADER_HEIGHT = 8*mm
+CONTINUED_HEADER_FONT_SIZE = 9
+
+# ページ番号（複数ページの場合のみ、右下に「ページ 1 / 3」の形式で表示）
+PAGE_NUMBER_FONT_SIZE = 7
+PAGE_NUMBER_Y = 3*mm
+
+# 商品テーブル
+PRODUCT_ROW_HEIGHT = 14*mm
+MIN_PRODUCT_ROWS = 6  # 空行を追加して最低この行数にする
+PRODUCT_HEADER_COLOR = colors.HexColor('#d4a700')
+PRODUCT_STRIPE_COLORS = [colors.white, colors.HexColor('#f8f8f8')]
+
+# 備考欄の左インデント（表のNo列と揃える）
+NOTES_INDENT = 12*mm
+
+# 商品テーブルのセル余白・文字列セルの行送り（pt）
+# platypus の Table にはスタイルで明示的に指定し、canvas 描画でも同じ値で位置を計算する
+CELL_PADDING_X = 6
+CELL_PADDING_Y = 3
+CELL_LEADING = 12
+
+# Paragraph でマークアップとして解釈される文字（含む場合は canvas 描画でも Paragraph を使う）
+_MARKUP_CHARS = frozenset('<>&')
+
+# 描画位置の比較の許容誤差（pt、platypus の Frame の判定と同じ値）
+LAYOUT_FUZZ = 1e-6
+
 # フォント設定
 FONT_NAME = "IPAGothic"
 FONT_REGISTERED = False
 
+# フォント登録・準備の所要時間など（get_font_load_stats で参照）
+_font_load_stats = None
+_font_lock = threading.Lock()
+_warmup_thread = None
+
+
 def register_font():
-    """日本語フォントを登録"""
-    global FONT_REGISTERED, FONT_NAME
+    """日本語フォントを登録
+
+    複数のスレッドから同時に呼ばれても登録は1度だけ行う。
+    """
+    global FONT_REGISTERED, FONT_NAME, _font_load_stats
     if FONT_REGISTERED:
         return
 
-    # フォントパスのリスト（優先順位順）
-    FONT_PATHS = [
-        # Linux (Streamlit Cloud) - IPAフォント
-        ("/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf", "IPAGothic"),
-        ("/usr/share/fonts/truetype/fonts-japanese-gothic.ttf", "IPAGothic"),
-        ("/usr/share/fonts/opentype/ipafont-gothic/ipagp.ttf", "IPAGothic"),
-        # Windows
-        ("C:/Windows/Fonts/msgothic.ttc", "MSGothic"),
-        ("C:/Windows/Fonts/meiryo.ttc", "Meiryo"),
-    ]
+    with _font_lock:
+        if FONT_REGISTERED:
+            return
 
-    for font_path, font_name in FONT_PATHS:
-        if Path(font_path).exists():
-            try:
-                pdfmetrics.registerFont(TTFont(font_name, font_path))
+        # フォントパスのリスト（優先順位順）
+        FONT_PATHS = [
+            # Linux (Streamlit Cloud) - IPAフォント
+            ("/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf", "IPAGothic"),
+            ("/usr/share/fonts/truetype/fonts-japanese-gothic.ttf", "IPAGothic"),
+            ("/usr/share/fonts/opentype/ipafont-gothic/ipagp.ttf", "IPAGothic"),
+            # Windows
+            ("C:/Windows/Fonts/msgothic.ttc", "MSGothic"),
+            ("C:/Windows/Fonts/meiryo.ttc", "Meiryo"),
+        ]
+
+        start = time.perf_counter()
+        for font_path, font_name in FONT_PATHS:
+            if Path(font_path).exists():
+                try:
+                    pdfmetrics.registerFont(TTFont(font_name, font_path))
+                except Exception:
+                    continue
                 FONT_NAME = font_name
+                _font_load_stats = {
+                    'font_name': font_name,
+                    'path': font_path,
+                    'seconds': time.perf_counter() - start,
+                }
                 FONT_REGISTERED = True
                 return
-            except Exception:
-                continue
 
-    # フォントが見つからない場合はデフォルトを使用
-    FONT_NAME = "Helvetica"
-    FONT_REGISTERED = True
+        # フォントが見つからない場合はデフォルトを使用
+        FONT_NAME = "Helvetica"
+        _font_load_stats = {
+            'font_name': FONT_NAME,
+            'path': None,
+            'seconds': time.perf_counter() - start,
+        }
+        FONT_REGISTERED = True
+
+
+def get_font_load_stats():
+    """フォント登録の結果（フォント名・パス・所要秒数、準備が済んでいれば準備全体の秒数）を取得（未登録なら None）"""
+    return _font_load_stats
+
+
+def _warm_up():
+    """フォント登録・見積書テンプレート・画像マニフェストの準備を済ませ、所要時間を記録（画面の下部に表示）"""
+    start = time.perf_counter()
+    register_font()
+    get_quote_template()
+    get_image_manifest().entries()
+    get_font_load_stats()['warmup_seconds'] = time.perf_counter() - start
+
+
+def start_warmup():
+    """フォント登録などPDF生成の準備をバックグラウンドのスレッドで開始（2回目以降は何もしない）
+
+    準備が終わる前に generate_pdf が呼ばれた場合は、登録が終わるのを待ってから生成する。
+    """
+    global _warmup_thread
+    with _font_lock:
+        if _warmup_thread is None and not FONT_REGISTERED:
+            _warmup_thread = threading.Thread(target=_warm_up, name="pdf-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+class _ReaderImage(Flowable):
+    """読み込み済みの ImageReader を描画する画像（platypus の Image と同じ配置・描画）"""
+
+    def __init__(self, reader, width, height):
+        super().__init__()
+        self.reader = reader
+        self.drawWidth = width
+        self.drawHeight = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.drawWidth, self.drawHeight, mask='auto')
+
+
+def _make_image(entry, max_width, max_height):
+    """マニフェストの画像情報から縦横比を維持した Image を作成"""
+    if entry['box'] == (max_width, max_height):
+        width, height = entry['display_width'], entry['display_height']
+    else:
+        width, height = fit_size(entry['width'], entry['height'], max_width, max_height)
+
+    if not USE_IMAGE_THUMBNAILS:
+        return Image(str(entry['path']), width=width, height=height)
+
+    # 読み込み済みの画像を再利用（ファイルを開き直さない）
+    return _ReaderImage(entry['thumbnail_reader'], width, height)
 
 
 def get_product_image(image_filename, max_width=10*mm, max_height=10*mm):
@@ -57,280 +201,869 @@ def get_product_image(image_filename, max_width=10*mm, max_height=10*mm):
     if not image_filename:
         return ""
 
-    image_path = IMAGE_FOLDER / image_filename
-    if image_path.exists():
-        try:
-            # Pillowで元画像のサイズを取得
-            with PILImage.open(str(image_path)) as img:
-                orig_width, orig_height = img.size
-
-            # 縦横比を維持しながら、max_width/max_height内に収める
-            ratio = min(max_width / orig_width, max_height / orig_height)
-            new_width = orig_width * ratio
-            new_height = orig_height * ratio
-
-            return Image(str(image_path), width=new_width, height=new_height)
-        except Exception:
-            return ""
-    return ""
+    entry = get_image_manifest().get(image_filename)
+    if entry is None:
+        return ""
+    return _make_image(entry, max_width, max_height)
 
 
 def get_logo_image(max_width=50*mm, max_height=15*mm):
     """ロゴ画像を取得（縦横比を維持）"""
-    logo_path = IMAGE_FOLDER / "2foods_logo.png"
-    if logo_path.exists():
-        try:
-            with PILImage.open(str(logo_path)) as img:
-                orig_width, orig_height = img.size
-
-            ratio = min(max_width / orig_width, max_height / orig_height)
-            new_width = orig_width * ratio
-            new_height = orig_height * ratio
-
-            return Image(str(logo_path), width=new_width, height=new_height)
-        except Exception:
-            return None
-    return None
+    entry = get_image_manifest().get(LOGO_FILENAME)
+    if entry is None:
+        return None
+    return _make_image(entry, max_width, max_height)
 
 
-def generate_pdf(recipient, retailer, show_retailer, staff, quote_date, sales_area, products, notes):
-    """見積書PDFを生成"""
-    register_font()
+class QuoteTemplate:
+    """見積書のレイアウト部品（スタイル・列定義・TableStyle）
 
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(A4),
-        leftMargin=2*mm,
-        rightMargin=2*mm,
-        topMargin=5*mm,
-        bottomMargin=5*mm
-    )
+    フォントごとに1度だけ作成して generate_pdf の呼び出し間で共有する。
+    呼び出しごとには見積データの流し込みだけを行う。
+    """
 
-    elements = []
+    def __init__(self, font_name):
+        self.font_name = font_name
 
-    # スタイル設定
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'Title',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=14,
-        leading=18,
-    )
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=9,
-        leading=12,
-        leftIndent=4*mm,  # 表のNo列と揃える
-    )
-    small_style = ParagraphStyle(
-        'Small',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=8,
-        leading=10,
-    )
+        # スタイル設定
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'Title',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=14,
+            leading=18,
+        )
+        self.normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=9,
+            leading=12,
+            leftIndent=4*mm,  # 表のNo列と揃える
+        )
+        self.small_style = ParagraphStyle(
+            'Small',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=8,
+            leading=10,
+        )
+        # 右寄せスタイル
+        self.right_style = ParagraphStyle(
+            'RightAlign',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=9,
+            leading=12,
+            alignment=2,  # 右寄せ
+        )
+        # セル内で改行可能なスタイル
+        self.cell_style = ParagraphStyle(
+            'Cell',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=7,
+            leading=8,
+            alignment=1,  # 中央揃え
+        )
+        # ヘッダー用スタイル（白文字・中央揃え）
+        self.header_style = ParagraphStyle(
+            'HeaderCell',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=7,
+            leading=8,
+            alignment=1,  # 中央揃え
+            textColor=colors.white,
+        )
+        # 備考用スタイル
+        self.notes_style = ParagraphStyle(
+            'Notes',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=9,
+            leading=12,
+        )
+
+        # ヘッダー情報の表
+        self.header_col_widths = [120*mm, 40*mm, 110*mm]
+        self.header_table_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('VALIGN', (2, 0), (2, 1), 'BOTTOM'),  # 会社情報は下揃え
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+            ('SPAN', (0, 0), (0, 1)),  # ロゴを1-2行目にまたがらせる
+            ('SPAN', (2, 0), (2, 1)),  # 会社情報を1-2行目にまたがらせる
+        ])
+
+        # 商品テーブルのヘッダー行（改行するものは行ごとのタプル）
+        # A4横: 297mm、左右マージン2mm×2 = 使用可能幅 293mm
+        self.header_labels = {
+            # 特別条件あり
+            True: (
+                [
+                    'No', '画像', '温度帯', '販売者', '商品名', 'JANコード', 'ITFコード', 'ケースJAN',
+                    '容量', ('ケース', '入数'), ('想定', '小売価格'), '卸価格', ('特別', '条件'),
+                    ('販売', 'エリア'), ('発注', 'ロット'), ('賞味', '期限')
+                ],
+                # 合計: 293mm（16列）- 商品名・容量を拡大
+                [6*mm, 12*mm, 10*mm, 10*mm, 44*mm, 23*mm, 25*mm, 23*mm,
+                 12*mm, 12*mm, 16*mm, 12*mm, 11*mm, 12*mm, 24*mm, 11*mm],
+            ),
+            # 特別条件なし
+            False: (
+                [
+                    'No', '画像', '温度帯', '販売者', '商品名', 'JANコード', 'ITFコード', 'ケースJAN',
+                    '容量', ('ケース', '入数'), ('想定', '小売価格'), '卸価格',
+                    ('販売', 'エリア'), ('発注', 'ロット'), ('賞味', '期限')
+                ],
+                # 合計: 293mm（15列）- 商品名・容量を拡大
+                [6*mm, 12*mm, 10*mm, 10*mm, 52*mm, 24*mm, 26*mm, 24*mm,
+                 13*mm, 13*mm, 17*mm, 13*mm, 13*mm, 26*mm, 12*mm],
+            ),
+        }
+        # platypus 用（改行するヘッダーは Paragraph）
+        self.layouts = {
+            has_special: ([self.lines_paragraph(label, self.header_style) for label in labels], col_widths)
+            for has_special, (labels, col_widths) in self.header_labels.items()
+        }
+
+        self._canvas_layouts = {}
+        self._header_block_layouts = {}
+        self.product_table_style = TableStyle([
+            # ヘッダースタイル
+            ('BACKGROUND', (0, 0), (-1, 0), PRODUCT_HEADER_COLOR),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, -1), font_name),
+            ('FONTSIZE', (0, 0), (-1, 0), 7),
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEADING', (0, 0), (-1, -1), CELL_LEADING),
+            ('LEFTPADDING', (0, 0), (-1, -1), CELL_PADDING_X),
+            ('RIGHTPADDING', (0, 0), (-1, -1), CELL_PADDING_X),
+            ('TOPPADDING', (0, 0), (-1, -1), CELL_PADDING_Y),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), CELL_PADDING_Y),
+            # 枠線
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOX', (0, 0), (-1, -1), 1, colors.grey),
+            # 交互の背景色
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), PRODUCT_STRIPE_COLORS),
+        ])
+
+    @staticmethod
+    def lines_paragraph(cell, style):
+        """行ごとのタプルのセルを改行入りの Paragraph に変換（文字列などはそのまま返す）"""
+        if isinstance(cell, tuple):
+            return Paragraph('<br/>'.join(cell), style)
+        return cell
+
+    def product_headers(self, has_special):
+        """商品テーブルのヘッダー行と列幅を取得
+
+        ヘッダーの Paragraph はレイアウト時に状態を持つため、呼び出しごとに複製して返す。
+        """
+        headers, col_widths = self.layouts[has_special]
+        return [copy.copy(h) for h in headers], col_widths
+
+    def canvas_layout(self, has_special):
+        """canvas 描画用の商品テーブルの座標を取得（列ごとに1度だけ計算）"""
+        layout = self._canvas_layouts.get(has_special)
+        if layout is None:
+            layout = self._canvas_layouts[has_special] = ProductGridLayout(self, has_special)
+        return layout
+
+    def header_block_layout(self, logo):
+        """canvas 描画用のヘッダー情報の座標を取得（ロゴの大きさごとに1度だけ計算）"""
+        key = (logo.drawWidth, logo.drawHeight)
+        layout = self._header_block_layouts.get(key)
+        if layout is None:
+            layout = self._header_block_layouts[key] = HeaderBlockLayout(self, logo)
+        return layout
+
+
+class ProductGridLayout:
+    """商品テーブルの列位置・ヘッダー行の高さ
+
+    platypus の Table と同じ配置になるよう、ヘッダー行の高さは Table で1度だけ計算する。
+    """
+
+    def __init__(self, template, has_special):
+        labels, col_widths = template.header_labels[has_special]
+        self.header_cells = labels
+        self.col_widths = col_widths
+        self.col_offsets = [0]
+        for width in col_widths:
+            self.col_offsets.append(self.col_offsets[-1] + width)
+        self.table_width = self.col_offsets[-1]
+
+        header_row = Table([template.product_headers(has_special)[0]], colWidths=col_widths)
+        header_row.setStyle(template.product_table_style)
+        _, self.header_height = header_row.wrap(self.table_width, PAGE_SIZE[1])
+
+
+class _CellProbe(Flowable):
+    """Table がセル内の Flowable に渡す幅と描画位置を記録する（座標の事前計算用）
+
+    width を省略すると、Paragraph と同じくセルの幅いっぱいに広がる。
+    """
+
+    def __init__(self, height, width=None):
+        super().__init__()
+        self.fixed_width = width
+        self.height = height
+        self.avail_width = None
+        self.position = None
+
+    def wrap(self, availWidth, availHeight):
+        self.avail_width = availWidth
+        return (availWidth if self.fixed_width is None else self.fixed_width), self.height
+
+    def drawOn(self, canv, x, y, _sW=0):
+        self.position = (x, y)
 
-    # ヘッダー情報
+
+class HeaderBlockLayout:
+    """ヘッダー情報の表の大きさと、表の左下を原点とした各欄（ロゴ・会社情報・送付先・連絡先）の位置
+
+    各欄が折り返さなければ行数は変わらないため、同じ行数の欄の代わりに _CellProbe を入れた表を
+    1度だけ描画し、Table が各欄を置く位置と幅を記録する。
+    """
+
+    def __init__(self, template, logo):
+        right_leading = template.right_style.leading
+        self.logo = _CellProbe(logo.drawHeight, logo.drawWidth)
+        self.company = _CellProbe(3*right_leading)
+        self.addressee = _CellProbe(2*template.normal_style.leading)
+        self.contact = _CellProbe(3*right_leading)
+        table = _header_table(template, self.logo, self.company, self.addressee, self.contact)
+        self.width, self.height = table.wrap(*PAGE_SIZE)
+        table.drawOn(canvas.Canvas(io.BytesIO()), 0, 0)
+
+
+_templates = {}
+
+
+def get_quote_template():
+    """現在のフォント用の見積書テンプレートを取得（フォントごとに1度だけ作成）"""
+    template = _templates.get(FONT_NAME)
+    if template is None:
+        template = _templates[FONT_NAME] = QuoteTemplate(FONT_NAME)
+    return template
+
+
+def _header_table(template, logo, company, addressee, contact):
+    """ヘッダー情報の表を作成（ロゴ・会社情報・送付先・連絡先の各欄を配置）"""
+    header_data = [
+        [logo, "", company],
+        ["", "", ""],
+        [addressee, "", contact],
+    ]
+    header_table = Table(header_data, colWidths=template.header_col_widths)
+    header_table.setStyle(template.header_table_style)
+    return header_table
+
+
+def _header_lines(recipient, retailer, show_retailer, staff, quote_date):
+    """ヘッダー情報の会社情報・送付先・連絡先の各欄の行"""
     formatted_date = quote_date.replace("-", "/")
     retailer_text = f"{retailer}様" if show_retailer and retailer else ""
+    return (
+        ["株式会社TWO", f"担当：StrategicPlanning&Sales　{staff}", "連絡先：2foods-sales@two2.jp"],
+        [f"送付先：{recipient}様", f"対象小売企業名：{retailer_text}"],
+        ["電話番号：03-6869-0010", "FAX番号：03-4496-4769", f"日付：{formatted_date}"],
+    )
 
-    # ロゴ画像を取得（縦横比維持）
-    logo = get_logo_image(max_width=50*mm, max_height=15*mm)
+
+def _build_header_table(template, logo, recipient, retailer, show_retailer, staff, quote_date):
+    """ヘッダー情報の表を作成（logo は get_logo_image の戻り値）"""
     if logo is None:
-        logo = Paragraph("<b>2foods</b>", title_style)
-
-    # 右寄せスタイル
-    right_style = ParagraphStyle(
-        'RightAlign',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=9,
-        leading=12,
-        alignment=2,  # 右寄せ
+        logo = Paragraph("<b>2foods</b>", template.title_style)
+
+    company, addressee, contact = _header_lines(recipient, retailer, show_retailer, staff, quote_date)
+    # 固定の文言の「&」だけエスケープする（入力値はこれまでどおりマークアップとして扱う）
+    company[1] = company[1].replace("&Sales", "&amp;Sales", 1)
+    return _header_table(
+        template,
+        logo,
+        Paragraph("<br/>".join(company), template.right_style),
+        Paragraph("<br/>".join(addressee), template.normal_style),
+        Paragraph("<br/>".join(contact), template.right_style),
     )
 
-    header_data = [
-        [
-            logo,
-            "",
-            Paragraph(f"株式会社TWO<br/>担当：StrategicPlanning&amp;Sales　{staff}<br/>連絡先：2foods-sales@two2.jp", right_style)
-        ],
-        [
-            "",
-            "",
-            ""
-        ],
-        [
-            Paragraph(f"送付先：{recipient}様<br/>対象小売企業名：{retailer_text}", normal_style),
-            "",
-            Paragraph(f"電話番号：03-6869-0010<br/>FAX番号：03-4496-4769<br/>日付：{formatted_date}", right_style)
+
+def _build_product_row(index, p, has_special, sales_area):
+    """商品テーブルの1行分のセルを作成（改行するセルは行ごとのタプル）"""
+    special = p.get('special_condition', '')
+    # 数値のみの場合は「円」を付ける
+    if special and str(special).isdigit():
+        special = f"¥{special}"
+
+    # 商品画像を取得
+    product_image = get_product_image(p.get('image', ''), max_width=10*mm, max_height=10*mm)
+
+    # 発注ロットは改行対応
+    order_lot = p.get('order_lot', '')
+    # 改行ルール: 「（」の前、「以上」の前で改行
+    order_lot_lines = tuple(order_lot.replace('（', '\n（').replace('以上', '\n以上').split('\n'))
+
+    if has_special:
+        return [
+            str(index + 1),
+            product_image,
+            p.get('temperature', ''),
+            p.get('seller', 'TWO'),
+            p.get('name', ''),
+            p.get('jan', ''),
+            p.get('itf', ''),
+            p.get('case_jan', ''),
+            p.get('volume', ''),
+            p.get('case_qty', ''),
+            f"¥{p.get('retail_price', '')}",
+            f"¥{p.get('wholesale_price', '')}",
+            special,
+            sales_area,
+            order_lot_lines,
+            f"D{p.get('shelf_life', '')}"
         ]
+    return [
+        str(index + 1),
+        product_image,
+        p.get('temperature', ''),
+        p.get('seller', 'TWO'),
+        p.get('name', ''),
+        p.get('jan', ''),
+        p.get('itf', ''),
+        p.get('case_jan', ''),
+        p.get('volume', ''),
+        p.get('case_qty', ''),
+        f"¥{p.get('retail_price', '')}",
+        f"¥{p.get('wholesale_price', '')}",
+        sales_area,
+        order_lot_lines,
+        f"D{p.get('shelf_life', '')}"
     ]
 
-    header_table = Table(header_data, colWidths=[120*mm, 40*mm, 110*mm])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('VALIGN', (2, 0), (2, 1), 'BOTTOM'),  # 会社情報は下揃え
-        ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-        ('SPAN', (0, 0), (0, 1)),  # ロゴを1-2行目にまたがらせる
-        ('SPAN', (2, 0), (2, 1)),  # 会社情報を1-2行目にまたがらせる
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 5*mm))
-
-    # 商品テーブル
-    # 特別条件があるかチェック
-    has_special = any(p.get('special_condition') for p in products)
 
-    # セル内で改行可能なスタイル
-    cell_style = ParagraphStyle(
-        'Cell',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=7,
-        leading=8,
-        alignment=1,  # 中央揃え
-    )
+def _build_notes_paragraph(template, notes):
+    """備考欄の Paragraph を作成（備考がなければ None）"""
+    if not notes:
+        return None
+    notes_text = "<b>▼備考</b><br/>" + notes.replace("\n", "<br/>")
+    return Paragraph(notes_text, template.notes_style)
+
+
+class _PageGeometry:
+    """ページ内のフレーム位置（1ページ目は全面、2ページ目以降は続きのヘッダー分だけ上端を下げる）"""
+
+    def __init__(self):
+        page_width, page_height = PAGE_SIZE
+        self.x = PAGE_MARGIN_X + FRAME_PADDING
+        self.width = page_width - 2*PAGE_MARGIN_X - 2*FRAME_PADDING
+        self.bottom = PAGE_MARGIN_Y + FRAME_PADDING
+        self.first_top = page_height - PAGE_MARGIN_Y - FRAME_PADDING
+        self.later_top = self.first_top - CONTINUED_HEADER_HEIGHT
+
+    def frame(self, first_page, frame_id):
+        """platypus 用の Frame を作成"""
+        top = self.first_top if first_page else self.later_top
+        return Frame(
+            PAGE_MARGIN_X, PAGE_MARGIN_Y,
+            self.width + 2*FRAME_PADDING, top + FRAME_PADDING - PAGE_MARGIN_Y,
+            id=frame_id,
+        )
+
 
-    # ヘッダー用スタイル（白文字・中央揃え）
-    header_style = ParagraphStyle(
-        'HeaderCell',
-        parent=styles['Normal'],
-        fontName=FONT_NAME,
-        fontSize=7,
-        leading=8,
-        alignment=1,  # 中央揃え
-        textColor=colors.white,
+_PAGE = _PageGeometry()
+
+
+def _count_fitting_rows(available, header_height, limit):
+    """ヘッダー行に続けて available の高さに収まる商品行の数（Table の分割判定と同じ計算）"""
+    used = header_height
+    if used > available:
+        return 0
+    count = 0
+    while count < limit and used + PRODUCT_ROW_HEIGHT <= available:
+        used += PRODUCT_ROW_HEIGHT
+        count += 1
+    return count
+
+
+def _plan_product_pages(first_available, header_height, row_count):
+    """商品行をページごとに分割する行数のリストを作成
+
+    各ページの表は1ページに収まる行数だけで作るため、platypus で大きな表を分割し直す必要がない。
+    1ページ目に1行も入らない場合は先頭が 0 になる。
+    """
+    counts = []
+    remaining = row_count
+    available = first_available
+    while remaining:
+        count = _count_fitting_rows(available, header_height, remaining)
+        if count == 0 and counts:
+            count = 1  # 1行も入らない高さのページは存在しないが、無限ループを避ける
+        counts.append(count)
+        remaining -= count
+        available = _PAGE.later_top - _PAGE.bottom
+    return counts
+
+
+def _continued_header(quote_header):
+    """2ページ目以降の続きのヘッダーに入れる送付先・日付"""
+    recipient, _, _, _, quote_date = quote_header
+    return recipient, quote_date.replace("-", "/")
+
+
+def _draw_continued_header(canv, template, recipient, formatted_date):
+    """2ページ目以降の上部に送付先・日付を描画"""
+    page_width, page_height = PAGE_SIZE
+    y = page_height - PAGE_MARGIN_Y - FRAME_PADDING - CONTINUED_HEADER_FONT_SIZE
+    canv.saveState()
+    canv.setFont(template.font_name, CONTINUED_HEADER_FONT_SIZE)
+    canv.setFillColor(colors.black)
+    canv.drawString(_PAGE.x + NOTES_INDENT, y, f"送付先：{recipient}様　御見積書（続き）")
+    canv.drawRightString(_PAGE.x + _PAGE.width, y, f"日付：{formatted_date}")
+    canv.restoreState()
+
+
+class _NumberedCanvas(canvas.Canvas):
+    """全ページ数が分かってからページ番号を入れる Canvas（1ページのみの場合は入れない）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._page_states = []
+
+    def showPage(self):
+        self._page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        total = len(self._page_states)
+        for number, state in enumerate(self._page_states, start=1):
+            self.__dict__.update(state)
+            if total > 1:
+                self._draw_page_number(number, total)
+            super().showPage()
+        super().save()
+
+    def _draw_page_number(self, number, total):
+        self.saveState()
+        self.setFont(FONT_NAME, PAGE_NUMBER_FONT_SIZE)
+        self.setFillColor(colors.grey)
+        self.drawRightString(_PAGE.x + _PAGE.width, PAGE_NUMBER_Y, f"ページ {number} / {total}")
+        self.restoreState()
+
+
+def _render_platypus(buffer, template, quote_header, has_special, rows, notes, invariant):
+    """platypus のフローレイアウトで見積書を描画"""
+    doc = BaseDocTemplate(
+        buffer,
+        pagesize=PAGE_SIZE,
+        leftMargin=PAGE_MARGIN_X,
+        rightMargin=PAGE_MARGIN_X,
+        topMargin=PAGE_MARGIN_Y,
+        bottomMargin=PAGE_MARGIN_Y,
+        invariant=invariant,
     )
+    page_header = _continued_header(quote_header)
+    doc.addPageTemplates([
+        PageTemplate(id='First', frames=[_PAGE.frame(True, 'first')], autoNextPageTemplate='Later'),
+        PageTemplate(
+            id='Later',
+            frames=[_PAGE.frame(False, 'later')],
+            onPage=lambda canv, doc: _draw_continued_header(canv, template, *page_header),
+        ),
+    ])
 
-    # ヘッダー行（改行対応）
-    # A4横: 297mm、左右マージン2mm×2 = 使用可能幅 293mm
-    if has_special:
-        table_headers = [
-            'No', '画像', '温度帯', '販売者', '商品名', 'JANコード', 'ITFコード', 'ケースJAN',
-            '容量', Paragraph('ケース<br/>入数', header_style), Paragraph('想定<br/>小売価格', header_style),
-            '卸価格', Paragraph('特別<br/>条件', header_style), Paragraph('販売<br/>エリア', header_style),
-            Paragraph('発注<br/>ロット', header_style), Paragraph('賞味<br/>期限', header_style)
-        ]
-        # 合計: 293mm（16列）- 商品名・容量を拡大
-        col_widths = [6*mm, 12*mm, 10*mm, 10*mm, 44*mm, 23*mm, 25*mm, 23*mm,
-                     12*mm, 12*mm, 16*mm, 12*mm, 11*mm, 12*mm, 24*mm, 11*mm]
-    else:
-        table_headers = [
-            'No', '画像', '温度帯', '販売者', '商品名', 'JANコード', 'ITFコード', 'ケースJAN',
-            '容量', Paragraph('ケース<br/>入数', header_style), Paragraph('想定<br/>小売価格', header_style),
-            '卸価格', Paragraph('販売<br/>エリア', header_style), Paragraph('発注<br/>ロット', header_style),
-            Paragraph('賞味<br/>期限', header_style)
-        ]
-        # 合計: 293mm（15列）- 商品名・容量を拡大
-        col_widths = [6*mm, 12*mm, 10*mm, 10*mm, 52*mm, 24*mm, 26*mm, 24*mm,
-                     13*mm, 13*mm, 17*mm, 13*mm, 13*mm, 26*mm, 12*mm]
-
-    table_data = [table_headers]
-
-    # 商品データ行
-    for i, p in enumerate(products):
-        special = p.get('special_condition', '')
-        # 数値のみの場合は「円」を付ける
-        if special and str(special).isdigit():
-            special = f"¥{special}"
-
-        # 商品画像を取得
-        product_image = get_product_image(p.get('image', ''), max_width=10*mm, max_height=10*mm)
-
-        # 発注ロットは改行対応
-        order_lot = p.get('order_lot', '')
-        # 改行ルール: 「（」の前、「以上」の前で改行
-        order_lot_formatted = order_lot.replace('（', '<br/>（').replace('以上', '<br/>以上')
-        order_lot_para = Paragraph(order_lot_formatted, cell_style)
-
-        if has_special:
-            row = [
-                str(i + 1),
-                product_image,
-                p.get('temperature', ''),
-                p.get('seller', 'TWO'),
-                p.get('name', ''),
-                p.get('jan', ''),
-                p.get('itf', ''),
-                p.get('case_jan', ''),
-                p.get('volume', ''),
-                p.get('case_qty', ''),
-                f"¥{p.get('retail_price', '')}",
-                f"¥{p.get('wholesale_price', '')}",
-                special,
-                sales_area,
-                order_lot_para,
-                f"D{p.get('shelf_life', '')}"
-            ]
-        else:
-            row = [
-                str(i + 1),
-                product_image,
-                p.get('temperature', ''),
-                p.get('seller', 'TWO'),
-                p.get('name', ''),
-                p.get('jan', ''),
-                p.get('itf', ''),
-                p.get('case_jan', ''),
-                p.get('volume', ''),
-                p.get('case_qty', ''),
-                f"¥{p.get('retail_price', '')}",
-                f"¥{p.get('wholesale_price', '')}",
-                sales_area,
-                order_lot_para,
-                f"D{p.get('shelf_life', '')}"
-            ]
-        table_data.append(row)
+    header_table = _build_header_table(template, get_logo_image(), *quote_header)
+    _, header_height = header_table.wrap(_PAGE.width, _PAGE.first_top - _PAGE.bottom)
+    elements = [header_table, Spacer(1, 5*mm)]
 
-    # 空行を追加して最低6行にする
-    while len(table_data) < 7:  # ヘッダー + 6行
-        empty_row = [''] * len(table_headers)
-        table_data.append(empty_row)
-
-    product_table = Table(table_data, colWidths=col_widths, rowHeights=[None] + [14*mm] * (len(table_data) - 1))
-    product_table.setStyle(TableStyle([
-        # ヘッダースタイル
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d4a700')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
-        ('FONTSIZE', (0, 0), (-1, 0), 7),
-        ('FONTSIZE', (0, 1), (-1, -1), 7),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        # 枠線
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('BOX', (0, 0), (-1, -1), 1, colors.grey),
-        # 交互の背景色
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f8f8')]),
-    ]))
-    elements.append(product_table)
+    # 商品テーブル（1ページに収まる行数ごとに表を分け、各ページにヘッダー行を入れる）
+    rows = [[template.lines_paragraph(cell, template.cell_style) for cell in row] for row in rows]
+    layout = template.canvas_layout(has_special)
+    first_available = _PAGE.first_top - header_height - 5*mm - _PAGE.bottom
+    start = 0
+    for count in _plan_product_pages(first_available, layout.header_height, len(rows)):
+        if not count:
+            continue
+        table_headers, col_widths = template.product_headers(has_special)
+        product_table = Table(
+            [table_headers] + rows[start:start + count],
+            colWidths=col_widths,
+            rowHeights=[None] + [PRODUCT_ROW_HEIGHT] * count,
+            repeatRows=1,
+        )
+        product_table.setStyle(template.product_table_style)
+        elements.append(product_table)
+        start += count
 
     # 備考欄
-    if notes:
+    notes_para = _build_notes_paragraph(template, notes)
+    if notes_para is not None:
         elements.append(Spacer(1, 5*mm))
-        # 備考用スタイル
-        notes_style = ParagraphStyle(
-            'Notes',
-            parent=styles['Normal'],
-            fontName=FONT_NAME,
-            fontSize=9,
-            leading=12,
-        )
-        notes_text = "<b>▼備考</b><br/>" + notes.replace("\n", "<br/>")
         # Indenterで左側にスペースを追加（表のNo列と揃える）
-        elements.append(Indenter(left=12*mm))
-        elements.append(Paragraph(notes_text, notes_style))
-        elements.append(Indenter(left=-12*mm))  # 元に戻す
+        elements.append(Indenter(left=NOTES_INDENT))
+        elements.append(notes_para)
+        elements.append(Indenter(left=-NOTES_INDENT))  # 元に戻す
 
     # PDF生成
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.getvalue()
+    doc.build(elements, canvasmaker=_NumberedCanvas)
+
+
+class _CanvasPage:
+    """canvas 描画で現在のページと書き込み位置を管理（_render_platypus のフレームと同じ配置）"""
+
+    def __init__(self, canv, template, page_header):
+        self.canv = canv
+        self.template = template
+        self.page_header = page_header
+        self.x = _PAGE.x
+        self.width = _PAGE.width
+        self.bottom = _PAGE.bottom
+        self.y = _PAGE.first_top
+
+    def fits(self, height):
+        return self.y - height >= self.bottom - LAYOUT_FUZZ
+
+    def available(self):
+        return self.y - self.bottom
+
+    def new_page(self):
+        self.canv.showPage()
+        _draw_continued_header(self.canv, self.template, *self.page_header)
+        self.y = _PAGE.later_top
+
+
+class _TextRun:
+    """表の文字列セルを1つのテキストオブジェクトにまとめて描画する
+
+    canvas.drawCentredString は文字列ごとにテキストオブジェクトを作りフォントを指定し直すため、
+    セルの多い表ではまとめて書き込み、最後に1度だけ canvas に出力する。
+    """
+
+    def __init__(self, canv, style):
+        self.canv = canv
+        self.font_name = style.fontName
+        self.font_size = style.fontSize
+        self.text = canv.beginText()
+        self.text.setFont(self.font_name, self.font_size, CELL_LEADING)
+
+    def set_color(self, color):
+        self.text.setFillColor(color)
+
+    def centred(self, x, y, line):
+        self.text.setTextOrigin(x - 0.5*pdfmetrics.stringWidth(line, self.font_name, self.font_size), y)
+        self.text.textOut(line)
+
+    def draw(self):
+        self.canv.drawText(self.text)
+
+
+def _is_plain_text(*texts):
+    """Paragraph でマークアップとして解釈される文字を含まないか"""
+    return not any(_MARKUP_CHARS.intersection(text) for text in texts)
+
+
+def _plain_lines(lines, style, width):
+    """幅 width の Paragraph を使わずに描画できる場合、各行の空白を Paragraph と同じくまとめたリストを返す
+
+    幅に収まらず折り返す行がある場合と、最後が空行（Paragraph では詰められる）の場合は None を返す。
+    マークアップを含まないことは呼び出し側で確認する。
+    """
+    if len(lines) > 1 and not lines[-1].strip():
+        return None
+    width -= style.leftIndent + style.rightIndent
+    result = []
+    for line in lines:
+        line = ' '.join(line.split())   # 全角空白を含む連続した空白は半角空白1つになる
+        # 境界付近で Paragraph の折り返しの判定と食い違わないよう、1pt の余裕を見る
+        if pdfmetrics.stringWidth(line, style.fontName, style.fontSize) > width - 1:
+            return None
+        result.append(line)
+    return result
+
+
+def _draw_lines(canv, style, x, y, width, lines):
+    """折り返さない複数行を、幅 width の Paragraph を (x, y) に置いた場合と同じ手順で描画
+
+    座標系を移動してから行ごとに相対位置で書き込み、Paragraph と同じ操作列にする
+    （表示側での文字位置の丸めが変わらないよう、絶対座標には置き換えない）。
+    """
+    canv.saveState()
+    canv.translate(x, y)
+    text = canv.beginText(style.leftIndent, len(lines)*style.leading - style.fontSize)
+    # 埋め込みフォントの指定は最初の文字まで出力されないため、空行の行送りに使う値を先に指定する
+    text.setLeading(style.leading)
+    text.setFillColor(style.textColor)
+    text.setFont(style.fontName, style.fontSize, style.leading)
+    available = width - style.leftIndent - style.rightIndent
+    for line in lines:
+        space = available - pdfmetrics.stringWidth(line, style.fontName, style.fontSize)
+        shift = {TA_LEFT: 0, TA_CENTER: 0.5*space, TA_RIGHT: space}[style.alignment]
+        moved = shift > 1e-6 or shift < -1e-6
+        if moved:
+            text.setXPos(shift)
+        text.textLine(line)
+        if moved:
+            text.setXPos(-shift)
+    canv.drawText(text)
+    canv.restoreState()
+
+
+def _draw_header_block(canv, template, page, quote_header):
+    """ヘッダー情報（ロゴ・会社情報・送付先・連絡先）を描画し、書き込み位置を下げる
+
+    ロゴがあり各欄が折り返さない場合は事前計算した位置に各欄を直接描画し、
+    それ以外は platypus と同じ Table で描画する。
+    """
+    recipient, retailer, _, staff, _ = quote_header
+    logo = get_logo_image()
+    if logo is not None:
+        block = template.header_block_layout(logo)
+        company, addressee, contact = _header_lines(*quote_header)
+        company = _plain_lines(company, template.right_style, block.company.avail_width)
+        addressee = _plain_lines(addressee, template.normal_style, block.addressee.avail_width)
+        contact = _plain_lines(contact, template.right_style, block.contact.avail_width)
+        if None not in (company, addressee, contact) and _is_plain_text(str(recipient), str(retailer), str(staff)):
+            # Frame が Table を置くのと同じく、表の左下に座標系を移動して各欄を描画する
+            canv.saveState()
+            canv.translate(page.x + 0.5*(page.width - block.width), page.y - block.height)
+            logo.drawOn(canv, *block.logo.position)
+            _draw_lines(canv, template.right_style, *block.company.position, block.company.avail_width, company)
+            _draw_lines(canv, template.normal_style, *block.addressee.position, block.addressee.avail_width, addressee)
+            _draw_lines(canv, template.right_style, *block.contact.position, block.contact.avail_width, contact)
+            canv.restoreState()
+            page.y -= block.height + 5*mm
+            return
+
+    header_table = _build_header_table(template, logo, *quote_header)
+    header_width, header_height = header_table.wrapOn(canv, page.width, page.available())
+    header_table.drawOn(canv, page.x + 0.5*(page.width - header_width), page.y - header_height)
+    page.y -= header_height + 5*mm
+
+
+def _row_positions(heights):
+    """表の上端から各行の下端までの y 座標（表の下端が 0、Table と同じく下の行から足し合わせる）"""
+    positions = []
+    height = error = 0
+    for row_height in reversed(heights):
+        positions.append(height)
+        # Table と同じ補正付きの足し算（座標の端数まで一致させる）
+        y = row_height - error
+        total = height + y
+        error = (total - height) - y
+        height = total
+    positions.append(height)
+    positions.reverse()
+    return positions
+
+
+def _draw_product_rows(canv, template, layout, x, top, rows):
+    """1ページ分の商品テーブル（ヘッダー行＋商品行）を描画（Table の描画順・座標の計算に合わせる）
+
+    文字列のセルは1つのテキストオブジェクトにまとめ、改行するセルは _draw_lines で描画する。
+    描画した表の下端の y 座標を返す。
+    """
+    col_positions = layout.col_offsets
+    col_widths = layout.col_widths
+    row_heights = [layout.header_height] + [PRODUCT_ROW_HEIGHT]*len(rows)
+    row_positions = _row_positions(row_heights)
+    width = col_positions[-1]
+    height = row_positions[0]
+    bottom = top - height
+
+    canv.saveState()
+    canv.translate(x, bottom)
+
+    # 背景（ヘッダー行・交互の背景色）
+    for i, y in enumerate(row_positions[:-1]):
+        color = PRODUCT_STRIPE_COLORS[(i - 1) % len(PRODUCT_STRIPE_COLORS)] if i else PRODUCT_HEADER_COLOR
+        canv.setFillColor(color)
+        canv.rect(0, y, width, row_positions[i + 1] - y, stroke=0, fill=1)
+
+    text = _TextRun(canv, template.cell_style)
+    cells = [(layout.header_cells, template.header_style)] + [(row, template.cell_style) for row in rows]
+    for (row, style), rowpos, row_height in zip(cells, row_positions[1:], row_heights):
+        text.set_color(style.textColor)
+        # 文字列セルのベースライン（上下中央揃え・1行）
+        text_y = rowpos + (CELL_PADDING_Y + row_height - CELL_PADDING_Y + CELL_LEADING)/2.0 - style.fontSize
+        for cell, colpos, col_width in zip(row, col_positions, col_widths):
+            if isinstance(cell, tuple):
+                lines = _is_plain_text(*cell) and _plain_lines(cell, style, col_width - 2*CELL_PADDING_X)
+                if lines:
+                    x0, y0 = _cell_origin(colpos, rowpos, col_width, row_height, len(lines)*style.leading)
+                    _draw_lines(canv, style, x0, y0, col_width - 2*CELL_PADDING_X, lines)
+                    continue
+                cell = template.lines_paragraph(cell, style)
+            if isinstance(cell, Flowable):
+                cell_width, cell_height = cell.wrapOn(canv, col_width - 2*CELL_PADDING_X, row_height - 2*CELL_PADDING_Y)
+                x0, y0 = _cell_origin(colpos, rowpos, col_width, row_height, cell_height, cell_width)
+                cell.drawOn(canv, x0, y0)
+            elif cell:
+                text.centred(colpos + (col_width + CELL_PADDING_X - CELL_PADDING_X)*0.5, text_y, str(cell))
+    text.draw()
+
+    # 枠線（GRID 0.5pt の後に BOX 1pt）
+    canv.setLineCap(1)
+    canv.setLineJoin(1)
+    canv.setStrokeColor(colors.grey)
+    for weight, inner in ((0.5, True), (1, False)):
+        canv.setLineWidth(weight)
+        canv.line(0, height, width, height)
+        canv.line(0, 0, width, 0)
+        canv.line(0, 0, 0, height)
+        canv.line(width, 0, width, height)
+        if inner:
+            for y in row_positions[1:-1]:
+                canv.line(0, y, width, y)
+            for cx in col_positions[1:-1]:
+                canv.line(cx, 0, cx, height)
+
+    canv.restoreState()
+    return bottom
+
+
+def _cell_origin(colpos, rowpos, col_width, row_height, height, width=None):
+    """中央揃え・上下中央のセルに置く Flowable の左下の座標（Table._drawCell と同じ計算）
+
+    width を省略すると Paragraph と同じくセルの幅いっぱいの大きさとする。
+    """
+    if width is None:
+        width = col_width - CELL_PADDING_X - CELL_PADDING_X
+    x = colpos + (col_width + CELL_PADDING_X - CELL_PADDING_X - width)/2.0
+    y = rowpos + (row_height + CELL_PADDING_Y - CELL_PADDING_Y + height)/2.0
+    return x, y - height
+
+
+def _draw_notes(canv, template, page, notes):
+    """備考欄を描画（ページに収まらない分は Paragraph の分割と同じ規則で次のページへ送る）"""
+    style = template.notes_style
+    notes_x = page.x + NOTES_INDENT
+    notes_width = page.width - NOTES_INDENT
+    lines = _is_plain_text(notes) and _plain_lines(["▼備考", *notes.split("\n")], style, notes_width)
+
+    if not page.fits(5*mm):
+        page.new_page()
+    page.y -= 5*mm
+
+    if not lines:
+        notes_para = _build_notes_paragraph(template, notes)
+        while True:
+            _, height = notes_para.wrapOn(canv, notes_width, page.available())
+            if page.fits(height):
+                notes_para.drawOn(canv, notes_x, page.y - height)
+                page.y -= height
+                return
+            parts = notes_para.splitOn(canv, notes_width, page.available())
+            if len(parts) == 2:
+                _, height = parts[0].wrapOn(canv, notes_width, page.available())
+                parts[0].drawOn(canv, notes_x, page.y - height)
+                notes_para = parts[1]
+            page.new_page()
+
+    while lines:
+        count = len(lines)
+        if not page.fits(count*style.leading):
+            # 収まる行数（1行しか入らない場合は分割せずに次のページへ送る）
+            count = int(page.available() / style.leading)
+            if count <= 1 or count >= len(lines):
+                page.new_page()
+                continue
+        height = count*style.leading
+        _draw_lines(canv, style, notes_x, page.y - height, notes_width, lines[:count])
+        page.y -= height
+        if count == len(lines):
+            return
+        # Paragraph の分割と同じく、改行の後で分けた続きは先頭が空行になる
+        lines = [""] + lines[count:]
+        page.new_page()
+
+
+def _render_canvas(buffer, template, quote_header, has_special, rows, notes, invariant):
+    """事前計算した座標で canvas に見積書を直接描画
+
+    文字列は Paragraph・Table を介さずにテキストオブジェクトへ書き込み、画像はそのまま drawImage する。
+    折り返しが必要な文字列・マークアップを含む文字列だけ Paragraph で描画する。
+    ページ分割（商品行・備考）は _render_platypus と同じ規則で行う。
+    """
+    canv = _NumberedCanvas(buffer, pagesize=PAGE_SIZE, invariant=invariant)
+    page = _CanvasPage(canv, template, _continued_header(quote_header))
+    layout = template.canvas_layout(has_special)
+
+    # ヘッダー情報（中央揃え）
+    _draw_header_block(canv, template, page, quote_header)
+
+    # 商品テーブル（1ページに収まる行数ごとに描画し、各ページにヘッダー行を入れる）
+    table_x = page.x + 0.5*(page.width - layout.table_width)
+    start = 0
+    for i, count in enumerate(_plan_product_pages(page.available(), layout.header_height, len(rows))):
+        if i:
+            page.new_page()
+        if count:
+            page.y = _draw_product_rows(canv, template, layout, table_x, page.y, rows[start:start + count])
+            start += count
+
+    # 備考欄
+    if notes:
+        _draw_notes(canv, template, page, notes)
+
+    canv.showPage()
+    canv.save()
+
+
+ENGINES = {
+    'platypus': _render_platypus,
+    'canvas': _render_canvas,
+}
+
+
+def generate_pdf(recipient, retailer, show_retailer, staff, quote_date, sales_area, products, notes,
+                 engine=None, deterministic=None):
+    """見積書PDFを生成
+
+    engine で描画方式（省略時は PDF_ENGINE）、deterministic で決定的モード（省略時は
+    DETERMINISTIC_PDF）を指定できる。決定的モードでは同じ入力から同じバイト列を生成し、
+    生成結果をメモして同じ入力の再生成を省く。
+    """
+    engine = engine or PDF_ENGINE
+    render = ENGINES.get(engine)
+    if render is None:
+        raise ValueError(f"未対応のPDFエンジンです: {engine}")
+    if deterministic is None:
+        deterministic = DETERMINISTIC_PDF
+
+    register_font()
+
+    memo_key = None
+    if deterministic:
+        memo_key = get_pdf_memo_key(
+            engine, recipient, retailer, show_retailer, staff, quote_date, sales_area, products, notes
+        )
+        pdf_data = _pdf_memo.get(memo_key)
+        if pdf_data is not None:
+            return pdf_data
+
+    template = get_quote_template()
+
+    # 特別条件があるかチェック
+    has_special = any(p.get('special_condition') for p in products)
+    rows = [_build_product_row(i, p, has_special, sales_area) for i, p in enumerate(products)]
+
+    # 空行を追加して最低6行にする
+    column_count = len(template.layouts[has_special][1])
+    while len(rows) < MIN_PRODUCT_ROWS:
+        rows.append([''] * column_count)
+
+    quote_header = (recipient, retailer, show_retailer, staff, quote_date)
+
+    buffer = io.BytesIO()
+    render(buffer, template, quote_header, has_special, rows, notes, deterministic)
+    pdf_data = buffer.getvalue()
+
+    if memo_key is not None:
+        _pdf_memo.put(memo_key, pdf_data)
+    return pdf_data
 
 
 def get_pdf_filename(recipient, quote_date):
@@ -339,3 +1072,113 @@ def get_pdf_filename(recipient, quote_date):
     date_parts = quote_date.split('-')
     yymmdd = date_parts[0][2:] + date_parts[1] + date_parts[2]
     return f"{yymmdd}_{recipient}様_お見積書.pdf"
+
+
+def get_pdf_inputs(quote):
+    """保存済みの見積（dict）から generate_pdf の引数を作成"""
+    return {
+        'recipient': quote['recipient'],
+        'retailer': quote.get('retailer', ''),
+        'show_retailer': bool(quote.get('retailer')),
+        'staff': quote['staff'],
+        'quote_date': quote['quote_date'],
+        'sales_area': quote['sales_area'],
+        'products': quote['products'],
+        'notes': quote.get('notes', ''),
+    }
+
+
+def get_quote_hash(recipient, retailer, show_retailer, staff, quote_date, sales_area, products, notes):
+    """見積入力のハッシュを生成（同じ内容の見積は同じ値になる）"""
+    payload = {
+        'recipient': recipient,
+        'retailer': retailer,
+        'show_retailer': bool(show_retailer),
+        'staff': staff,
+        'quote_date': str(quote_date),
+        'sales_area': sales_area,
+        'products': products,
+        'notes': notes,
+    }
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def get_pdf_memo_key(engine, recipient, retailer, show_retailer, staff, quote_date, sales_area, products, notes):
+    """生成済みPDFのメモのキーを作成
+
+    見積入力のハッシュに、出力に影響するテンプレートの版・描画方式・フォント・画像を加える。
+    """
+    payload = {
+        'quote': get_quote_hash(recipient, retailer, show_retailer, staff, quote_date, sales_area, products, notes),
+        'template_version': TEMPLATE_VERSION,
+        'engine': engine,
+        'font': FONT_NAME,
+        'images': get_image_manifest().fingerprint(),
+        'thumbnails': USE_IMAGE_THUMBNAILS,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PdfMemo:
+    """生成済みPDFのLRUメモ（合計バイト数で上限を設ける）"""
+
+    def __init__(self, max_bytes=PDF_MEMO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """メモ済みのPDFを取得（なければ None）"""
+        with self._lock:
+            pdf_data = self._entries.get(key)
+            if pdf_data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pdf_data
+
+    def put(self, key, pdf_data):
+        """PDFをメモに保存（上限を超えた分は古いものから破棄）"""
+        if len(pdf_data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = pdf_data
+            self._size += len(pdf_data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        """メモを全て破棄"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """ヒット数・ミス数・使用バイト数などの統計を取得"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
+
+
+_pdf_memo = PdfMemo()
+
+
+def get_pdf_memo():
+    """プロセス共通の生成済みPDFのメモを取得"""
+    return _pdf_memo
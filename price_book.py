@@ -0,0 +1,116 @@
+# 価格表モジュール（標準卸価格の改定履歴と、日付時点の価格の検索）
+#
+# 商品（JAN）・ロットごとに適用開始日の順で価格を持ち、二分探索で「その日に有効だった価格」を求める。
+# 過去の見積の明細を何千件とまとめて調べても、1件あたりの検索は改定回数に対して O(log n)。
+
+from bisect import bisect_right
+from datetime import date, datetime
+from functools import lru_cache
+
+# 2Water以外の商品のロット（商品ごとに1つの価格）
+NO_LOT = ""
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value):
+    return date.fromisoformat(value).toordinal()
+
+
+def to_ordinal(value):
+    """日付（date・datetime・"YYYY-MM-DD" の文字列）を序数に変換"""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return _parse_date(str(value)[:10])
+
+
+def item_lot(item):
+    """見積の明細の価格表上のロット（2Waterは発注ロット、それ以外は NO_LOT）"""
+    return item.get('order_lot', NO_LOT) if item.get('is_water') else NO_LOT
+
+
+class PriceBook:
+    """標準卸価格の価格表
+
+    entries は (JAN, ロット, 適用開始日, 価格) の組。改定履歴のない商品・ロットは
+    current_prices の価格（商品マスタの現在の価格）が全期間に適用される。
+    改定履歴のある商品・ロットでは、最も古い履歴を開始価格として、それより前の日付にも適用する。
+    最新の履歴の価格は current_prices の価格と一致していなければならない（ValueError）。
+    """
+
+    def __init__(self, entries=(), current_prices=None):
+        series = {}
+        for jan, lot, effective_date, price in entries:
+            series.setdefault((jan, lot), []).append((to_ordinal(effective_date), price))
+
+        self._series = {}
+        for key, revisions in series.items():
+            revisions.sort()
+            days = [day for day, _ in revisions]
+            if len(set(days)) != len(days):
+                jan, lot = key
+                raise ValueError(f"同じ適用開始日の価格が複数あります: {jan} {lot}".rstrip())
+            self._series[key] = (days, [price for _, price in revisions])
+
+        for key, price in (current_prices or {}).items():
+            series = self._series.get(key)
+            if series is None:
+                self._series[key] = ([date.min.toordinal()], [price])
+            elif series[1][-1] != price:
+                # 履歴と商品マスタの価格が食い違うと、日付によって別の価格が「現在の価格」になる
+                jan, lot = key
+                raise ValueError(
+                    f"最新の改定履歴の価格（{series[1][-1]}円）が商品マスタの価格（{price}円）と"
+                    f"一致しません: {jan} {lot}".rstrip()
+                )
+
+    @classmethod
+    def from_catalog(cls, catalog, water_lot_patterns, entries=()):
+        """商品カタログ・2Waterのロット別価格を現在の価格として価格表を作成"""
+        current_prices = {}
+        for product in catalog:
+            if product.is_water:
+                for lot in water_lot_patterns:
+                    current_prices[(product.jan, lot['lot'])] = lot['default_price']
+            else:
+                current_prices[(product.jan, NO_LOT)] = product.wholesale_price
+        return cls(entries, current_prices)
+
+    def __len__(self):
+        return sum(len(days) for days, _ in self._series.values())
+
+    def price_as_of(self, jan, lot, on_date):
+        """on_date 時点の標準卸価格（価格表にない商品・ロットは None）"""
+        series = self._series.get((jan, lot))
+        if series is None:
+            return None
+        days, prices = series
+        index = bisect_right(days, to_ordinal(on_date)) - 1
+        return prices[max(index, 0)]
+
+    def prices_as_of(self, lookups):
+        """(JAN, ロット, 日付) の組ごとの標準卸価格をまとめて取得（価格表にない商品・ロットは None）"""
+        series_of = self._series.get
+        results = []
+        for jan, lot, on_date in lookups:
+            series = series_of((jan, lot))
+            if series is None:
+                results.append(None)
+                continue
+            days, prices = series
+            index = bisect_right(days, to_ordinal(on_date)) - 1
+            results.append(prices[max(index, 0)])
+        return results
+
+    def standard_prices(self, items, on_date):
+        """見積の明細ごとの on_date 時点の標準卸価格"""
+        return self.prices_as_of((item.get('jan'), item_lot(item), on_date) for item in items)
+
+    def history(self, jan, lot=NO_LOT):
+        """商品・ロットの価格の履歴（(適用開始日, 価格) の組を古い順に。改定履歴がなければ空）"""
+        days, prices = self._series.get((jan, lot), ((), ()))
+        return tuple(
+            (date.fromordinal(day), price) for day, price in zip(days, prices)
+            if day != date.min.toordinal()
+        )
@@ -0,0 +1,162 @@
+# 商品カタログモジュール（商品マスタの変更不可なレコードと検索用の索引）
+
+# 商品の項目（商品マスタの dict と同じ順）
+PRODUCT_FIELDS = (
+    "code", "name", "short_name", "seller", "brand", "category",
+    "jan", "itf", "case_jan", "volume", "case_qty", "order_lot",
+    "retail_price", "wholesale_price", "shelf_life", "temperature", "image",
+)
+
+# 「-」は未採番を表すため、商品コードの索引には含めない
+NO_CODE = "-"
+
+
+def _product_from_dict(fields):
+    return Product(**fields)
+
+
+class Product:
+    """商品マスタの1商品（作成後は変更できない）
+
+    属性で参照するほか、従来の dict と同じく product['name'] や product.get('image') でも参照できる。
+    """
+
+    __slots__ = PRODUCT_FIELDS + ("is_water",)
+
+    def __init__(self, **fields):
+        unknown = set(fields) - set(self.__slots__)
+        if unknown:
+            raise ValueError(f"未知の項目があります: {', '.join(sorted(unknown))}")
+        missing = [name for name in PRODUCT_FIELDS if name not in fields]
+        if missing:
+            raise ValueError(f"必須項目がありません: {', '.join(missing)}")
+
+        for name in PRODUCT_FIELDS:
+            object.__setattr__(self, name, fields[name])
+        object.__setattr__(self, "is_water", bool(fields.get("is_water", False)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("商品マスタのレコードは変更できません")
+
+    def __delattr__(self, name):
+        raise AttributeError("商品マスタのレコードは変更できません")
+
+    def __reduce__(self):
+        return _product_from_dict, (self.to_dict(),)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        """dict.get と同じ使い方で項目を取得"""
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self):
+        return hash((self.jan, self.short_name))
+
+    def __repr__(self):
+        return f"Product(jan={self.jan!r}, short_name={self.short_name!r})"
+
+    def to_dict(self):
+        """従来の商品マスタと同じ形の dict に変換（見積の明細・PDF・履歴の保存に使う）"""
+        fields = {name: getattr(self, name) for name in PRODUCT_FIELDS}
+        if self.is_water:
+            fields["is_water"] = True
+        return fields
+
+    def to_quote_item(self, wholesale_price, special_condition="", order_lot=None):
+        """見積の明細（卸価格・特別条件・2Waterのロットを反映した dict）を作成"""
+        item = self.to_dict()
+        if order_lot is not None:
+            item["order_lot"] = order_lot
+        item["wholesale_price"] = wholesale_price
+        item["special_condition"] = special_condition
+        return item
+
+
+class ProductCatalog:
+    """商品マスタ全体（表示順のレコードと JAN・略称・商品コード・ブランド・カテゴリの索引）
+
+    並び順は商品マスタの順で、商品選択画面・商品マスター画面・CSVの列の順に使う。
+    """
+
+    def __init__(self, products):
+        self._products = tuple(products)
+        self._by_jan = {}
+        self._by_short_name = {}
+        self._by_code = {}
+        self._by_brand = {}
+        self._by_category = {}
+
+        for product in self._products:
+            for index, key, label in ((self._by_jan, product.jan, "JAN"),
+                                      (self._by_short_name, product.short_name, "略称")):
+                if key in index:
+                    raise ValueError(f"{label}が重複しています: {key}")
+                index[key] = product
+            if product.code != NO_CODE:
+                if product.code in self._by_code:
+                    raise ValueError(f"商品コードが重複しています: {product.code}")
+                self._by_code[product.code] = product
+            self._by_brand.setdefault(product.brand, []).append(product)
+            self._by_category.setdefault(product.category, []).append(product)
+
+        self._by_brand = {brand: tuple(items) for brand, items in self._by_brand.items()}
+        self._by_category = {category: tuple(items) for category, items in self._by_category.items()}
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """商品マスタの dict のリストから作成"""
+        return cls(Product(**row) for row in rows)
+
+    def __iter__(self):
+        return iter(self._products)
+
+    def __len__(self):
+        return len(self._products)
+
+    def __getitem__(self, index):
+        return self._products[index]
+
+    def by_jan(self, jan):
+        """JANコードで検索（見つからなければ None）"""
+        return self._by_jan.get(jan)
+
+    def by_short_name(self, short_name):
+        """略称で検索（見つからなければ None）"""
+        return self._by_short_name.get(short_name)
+
+    def by_code(self, code):
+        """商品コードで検索（見つからなければ None）"""
+        return self._by_code.get(code)
+
+    def by_brand(self, brand):
+        """ブランドの商品を表示順で取得"""
+        return self._by_brand.get(brand, ())
+
+    def by_category(self, category):
+        """カテゴリの商品を表示順で取得"""
+        return self._by_category.get(category, ())
+
+    def brands(self):
+        """ブランドの一覧（表示順で最初に出てくる順）"""
+        return tuple(self._by_brand)
+
+    def categories(self):
+        """カテゴリの一覧（表示順で最初に出てくる順）"""
+        return tuple(self._by_category)
+
+    def short_names(self):
+        """略称の一覧（表示順、CSVの列の順）"""
+        return tuple(product.short_name for product in self._products)
+
+    def to_dicts(self):
+        """従来の商品マスタと同じ形の dict のリストに変換"""
+        return [product.to_dict() for product in self._products]
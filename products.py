@@ -1,5 +1,9 @@
 # 商品マスタデータ
 
+from product_catalog import ProductCatalog
+
+# 商品マスタ（表示順）。従来どおり dict のリストとしても参照できるよう残し、
+# 検索・表示順には下の CATALOG を使う
 PRODUCTS = [
     {
         "code": "1005038A0350",
@@ -194,6 +198,9 @@ PRODUCTS = [
     }
 ]
 
+# 商品カタログ（変更不可なレコードと JAN・略称などの索引）
+CATALOG = ProductCatalog.from_dicts(PRODUCTS)
+
 # 2Water用ロットパターン
 WATER_LOT_PATTERNS = [
     {"lot": "1ケース", "default_price": 108},
@@ -221,3 +228,9 @@ STAFF_LIST = ["室屋", "折原", "平", "安岡", "和田", "平岡", "青木",
 
 # 販売エリアリスト
 SALES_AREAS = ["全国", "北海道", "東北", "関東", "中部", "関西", "中国", "四国", "九州"]
+
+# 標準卸価格の改定履歴（適用開始日ごとの価格。2Waterはロットごとに指定）
+# 例: {"jan": "4589570801416", "effective_date": "2026-04-01", "wholesale_price": 118}
+#     {"jan": "4589570801485", "lot": "10ケース", "effective_date": "2026-04-01", "wholesale_price": 108}
+# 履歴のない商品・ロットは、上の商品マスタ・ロット別価格の価格を全期間の標準卸価格とする
+PRICE_HISTORY = []
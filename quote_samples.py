@@ -0,0 +1,87 @@
+# 見積PDFのサンプル入力と、描画方式（platypus・canvas）の見た目の比較
+#
+# benchmark.py の計測と tests/test_pdf_engines.py の両方から使う。
+# 比較（compare_quote_pdfs）には PyMuPDF が必要（requirements-dev.txt）。
+
+from products import CATALOG, WATER_LOT_PATTERNS
+
+
+def sample_products():
+    """全商品・2Water全ロットを選択した見積の商品リストを作成"""
+    selected = []
+    for product in CATALOG:
+        if product.is_water:
+            for lot in WATER_LOT_PATTERNS:
+                selected.append(product.to_quote_item(lot['default_price'], '', order_lot=lot['lot']))
+        else:
+            selected.append(product.to_quote_item(product.wholesale_price, '5'))
+    return selected
+
+
+def sample_quote(products=None):
+    """generate_pdf に渡す見積入力のサンプルを作成"""
+    return {
+        'recipient': "三菱食品株式会社",
+        'retailer': "セブンイレブン",
+        'show_retailer': True,
+        'staff': "室屋",
+        'quote_date': "2026-02-10",
+        'sales_area': "全国",
+        'products': sample_products() if products is None else products,
+        'notes': "・見積有効期限：次回提出時まで\n・返品不可",
+    }
+
+
+def render_pdf(quote, **options):
+    """生成済みPDFのメモを使わずに見積PDFを生成（計測・比較用）"""
+    import pdf_generator
+
+    pdf_generator.get_pdf_memo().clear()
+    return pdf_generator.generate_pdf(**quote, **options)
+
+
+def _render_pages(pdf_data, dpi):
+    """PDFの各ページをラスタライズして画素データのリストを返す"""
+    import pymupdf
+
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as doc:
+        return [page.get_pixmap(dpi=dpi).samples for page in doc]
+
+
+def compare_quote_pdfs(quote, dpi=100, tolerance=32):
+    """platypus と canvas の出力を比較し、ページごとの差分画素数を返す
+
+    ページ数が異なる場合は None を返す。
+    """
+    expected = _render_pages(render_pdf(quote, engine='platypus'), dpi)
+    actual = _render_pages(render_pdf(quote, engine='canvas'), dpi)
+    if len(expected) != len(actual):
+        return None
+    return [
+        sum(1 for a, b in zip(page_a, page_b) if abs(a - b) > tolerance)
+        for page_a, page_b in zip(expected, actual)
+    ]
+
+
+def engine_comparison_cases():
+    """platypus と canvas の見た目を比較する見積のパターン（名前 -> generate_pdf の入力）
+
+    canvas 描画が Paragraph・Table に戻して描画する入力（折り返す欄・マークアップ）も含める。
+    """
+    products = sample_products()
+    plain = [dict(p, special_condition='') for p in products]
+    return {
+        '特別条件あり': sample_quote(),
+        '特別条件なし': sample_quote(plain),
+        '商品2件・備考なし': dict(sample_quote(plain[:2]), notes=""),
+        '2ページ目に備考': dict(sample_quote(products[:9]), notes="\n".join(f"備考{i}" for i in range(40))),
+        '複数ページにまたがる備考': dict(sample_quote(products[:9]), notes="\n".join(f"備考{i}" for i in range(90))),
+        '3ページ': sample_quote(products * 2),
+        '備考の空行・空白': dict(sample_quote(plain[:2]), notes="・見積有効期限\n\n　・返品  不可"),
+        '備考の末尾の改行': dict(sample_quote(plain[:2]), notes="・見積有効期限\n・返品不可\n"),
+        '折り返す送付先': dict(sample_quote(plain[:2]), recipient="株式会社" + "サンプル食品販売" * 8),
+        'マークアップを含む入力': dict(
+            sample_quote(plain[:2]), staff="室屋&amp;佐藤", notes="・<b>重要</b>：返品不可",
+        ),
+        '小売企業名なし': dict(sample_quote(plain[:2]), show_retailer=False),
+    }
@@ -0,0 +1,6 @@
+# テスト共通設定（アプリのモジュールはリポジトリ直下にあるため、直下を import パスに加える）
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,192 @@
+# 生成物ストア（メモリ上限での退避・ディスク上限での破棄・期限切れ）と作成済みCSVのキャッシュのテスト
+
+import pytest
+
+import artifact_store
+import csv_export
+from artifact_store import ArtifactStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(artifact_store.time, "monotonic", clock)
+    return clock
+
+
+def _store(tmp_path, memory_limit=300, disk_limit=1000, ttl=60):
+    return ArtifactStore(memory_limit=memory_limit, disk_limit=disk_limit, ttl=ttl, folder=tmp_path)
+
+
+def _write(data):
+    return lambda output: output.write(data)
+
+
+def _files(tmp_path, pattern="*"):
+    return sorted(path.name for path in tmp_path.glob(pattern))
+
+
+def test_put_and_get_in_memory(tmp_path):
+    store = _store(tmp_path)
+    handle = store.put(b"a" * 100)
+    assert store.get(handle) == b"a" * 100
+    assert store.stats()['memory_bytes'] == 100
+    assert _files(tmp_path) == []
+
+
+def test_spills_oldest_to_disk_over_memory_limit(tmp_path):
+    store = _store(tmp_path)
+    handles = [store.put(bytes([i]) * 100) for i in range(5)]
+
+    stats = store.stats()
+    assert (stats['memory_bytes'], stats['disk_bytes'], stats['spills']) == (300, 200, 2)
+    assert _files(tmp_path) == sorted(f"{handle}.bin" for handle in handles[:2])
+    assert [store.get(handle) for handle in handles] == [bytes([i]) * 100 for i in range(5)]
+
+
+def test_discarded_while_spilling_leaves_no_file(tmp_path, monkeypatch):
+    store = _store(tmp_path, memory_limit=100)
+    first = store.put(b"a" * 100)
+
+    fdopen = artifact_store.os.fdopen
+
+    def discard_then_open(*args, **kwargs):
+        store.discard(first)   # 書き出している間に他のセッションが破棄した
+        return fdopen(*args, **kwargs)
+
+    monkeypatch.setattr(artifact_store.os, "fdopen", discard_then_open)
+    second = store.put(b"b" * 100)
+
+    assert store.get(first) is None
+    assert store.get(second) == b"b" * 100
+    assert store.stats()['disk_bytes'] == 0
+    assert _files(tmp_path) == []
+
+
+def test_trims_oldest_disk_entries_over_disk_limit(tmp_path):
+    store = _store(tmp_path, disk_limit=250)
+    first, _ = store.put_stream(_write(b"a" * 100))
+    second, _ = store.put_stream(_write(b"b" * 100))
+    third, _ = store.put_stream(_write(b"c" * 100))
+
+    assert store.get(first) is None
+    assert store.get(second) == b"b" * 100
+    assert store.get(third) == b"c" * 100
+    assert store.stats()['evictions'] == 1
+
+
+def test_get_refreshes_lru_order(tmp_path):
+    store = _store(tmp_path, disk_limit=250)
+    first, _ = store.put_stream(_write(b"a" * 100))
+    second, _ = store.put_stream(_write(b"b" * 100))
+    store.get(first)
+    store.put_stream(_write(b"c" * 100))
+
+    assert store.contains(first)
+    assert not store.contains(second)
+
+
+def test_oversized_stream_is_rejected_without_evicting_others(tmp_path):
+    store = _store(tmp_path, disk_limit=250)
+    kept = [store.put_stream(_write(b"a" * 50))[0] for _ in range(3)]
+    in_memory = store.put(b"m" * 10)
+
+    handle, value = store.put_stream(_write(b"x" * 300))
+
+    assert handle is None
+    assert value == 300   # write の戻り値はそのまま返す
+    assert all(store.contains(h) for h in [*kept, in_memory])
+    assert store.stats()['evictions'] == 0
+    assert _files(tmp_path, "*.tmp") == []
+
+
+def test_oversized_put_is_rejected_without_evicting_others(tmp_path):
+    store = _store(tmp_path, memory_limit=100, disk_limit=250)
+    kept, _ = store.put_stream(_write(b"a" * 200))
+
+    assert store.put(b"x" * 300) is None
+    assert store.contains(kept)
+
+
+def test_item_too_large_for_disk_is_evicted_instead_of_spilled(tmp_path):
+    store = _store(tmp_path, memory_limit=300, disk_limit=250)
+    kept, _ = store.put_stream(_write(b"a" * 200))
+    large = store.put(b"l" * 280)
+    store.put(b"s" * 100)   # メモリ上限を超え、最も古い large を退避しようとする
+
+    assert not store.contains(large)
+    assert store.contains(kept)
+
+
+def test_failed_stream_leaves_no_file(tmp_path):
+    store = _store(tmp_path)
+
+    def fail(output):
+        output.write(b"partial")
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        store.put_stream(fail)
+    assert _files(tmp_path) == []
+
+
+def test_expires_after_ttl_since_last_access(tmp_path, clock):
+    store = _store(tmp_path, memory_limit=100, ttl=60)
+    on_disk = store.put(b"d" * 100)
+    in_memory = store.put(b"m" * 100)
+
+    clock.now += 50
+    assert store.get(in_memory) is not None   # 最後に使った時刻が延びる
+    clock.now += 20
+
+    assert not store.contains(on_disk)
+    assert store.contains(in_memory)
+    assert store.stats()['disk_bytes'] == 0
+    assert _files(tmp_path) == []
+
+    clock.now += 60
+    assert store.get(in_memory) is None
+    assert store.stats()['memory_bytes'] == 0
+
+
+def test_clear_removes_leftover_files(tmp_path):
+    (tmp_path / "old.bin").write_bytes(b"old")
+    (tmp_path / "old.tmp").write_bytes(b"old")
+    store = _store(tmp_path)
+    store.put_stream(_write(b"a"))
+    store.clear()
+    assert _files(tmp_path) == []
+    assert store.stats()['entries'] == 0
+
+
+def _item_batches():
+    return iter([[(1, "小売", "送付先", "2026-04-01", "担当", "2Water", "1ケース", 108, "")]])
+
+
+def test_csv_export_cache_reuses_and_skips_second_query_when_too_large(tmp_path, monkeypatch):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return _item_batches()
+
+    store = _store(tmp_path)
+    monkeypatch.setattr(csv_export, "get_artifact_store", lambda: store)
+    cache = csv_export.CsvExportCache()
+
+    csv_data = cache.get_or_build("key", 0, factory)
+    assert cache.get_or_build("key", 0, factory) == csv_data
+    assert len(calls) == 1
+
+    store.disk_limit = len(csv_data) - 1
+    assert cache.get_or_build("key", 1, factory) == csv_data   # 保持できなくても作り直さずに返す
+    assert len(calls) == 2
+    assert _files(tmp_path, "*.tmp") == []
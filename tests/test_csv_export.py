@@ -0,0 +1,88 @@
+# 見積履歴CSVの書き出し（明細の縦持ちから横持ちへの一括の振り分け）のテスト
+#
+# write_quotes_csv の出力が、見積1件ずつ build_csv_row で行を作る generate_quotes_csv と
+# バイト単位で一致することを確認する。
+
+import io
+import random
+from datetime import date
+
+import pytest
+
+from csv_export import generate_quotes_csv, get_csv_product_order, write_quotes_csv
+
+LOTS = ["1ケース", "10ケース", "20ケース", "48ケース（パレット）", None]
+
+
+def _line_items(count, seed=0):
+    """database.iter_quote_items_for_export と同じ形の明細の行（明細なし・未知の商品・重複などを含む）"""
+    rng = random.Random(seed)
+    names = [*get_csv_product_order(), "終売品"]
+    rows = []
+    for quote_id in range(count, 0, -1):
+        quote = (quote_id, rng.choice(["セブンイレブン", "", None]), f"送付先{quote_id % 7}",
+                 date(2026, 1 + quote_id % 12, 1 + quote_id % 28), rng.choice(["室屋", "佐藤"]))
+        item_count = rng.choice([0, 1, 3, 8, 12])
+        if item_count == 0:
+            rows.append((*quote, None, None, None, None))
+        for _ in range(item_count):
+            name = rng.choice([*names, "2Water", "2Water"])
+            rows.append((
+                *quote, name,
+                rng.choice(LOTS) if name == "2Water" else rng.choice(["", None]),
+                rng.choice([100, 118, 1080, None]),
+                rng.choice(["", "5", "10", None]),
+            ))
+    return rows
+
+
+def _quotes(rows):
+    """明細の行を見積の dict（generate_quotes_csv の入力）にまとめる"""
+    quotes = {}
+    for quote_id, retailer, recipient, quote_date, staff, name, lot, price, special in rows:
+        quote = quotes.setdefault(quote_id, {
+            'retailer': retailer, 'recipient': recipient, 'quote_date': str(quote_date), 'staff': staff,
+            'products': [],
+        })
+        if name is not None:
+            quote['products'].append({
+                'short_name': name,
+                'order_lot': lot or '',
+                'wholesale_price': '' if price is None else price,
+                'special_condition': special or '',
+            })
+    return list(quotes.values())
+
+
+def _write(rows, batch_size):
+    output = io.BytesIO()
+    write_quotes_csv((rows[i:i + batch_size] for i in range(0, len(rows), batch_size)), output)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 100, 100000])
+def test_matches_row_by_row_csv(batch_size):
+    rows = _line_items(300)
+    assert _write(rows, batch_size) == generate_quotes_csv(_quotes(rows))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_row_by_row_csv_random(seed):
+    rows = _line_items(50, seed)
+    assert _write(rows, 13) == generate_quotes_csv(_quotes(rows))
+
+
+def test_water_lots_are_joined_per_quote():
+    rows = [
+        (2, "小売", "送付先", date(2026, 4, 1), "室屋", "2Water", "10ケース", 108, "5"),
+        (2, "小売", "送付先", date(2026, 4, 1), "室屋", "2Water", "48ケース（パレット）", 100, ""),
+        (1, "小売", "送付先", date(2026, 4, 2), "室屋", "2Water", "1ケース", 118, ""),
+    ]
+    csv_text = _write(rows, 1).decode("utf-8-sig")
+    assert '"10cs:108円, 48cs:100円",10cs:5円' in csv_text
+    assert "1cs:118円," in csv_text
+    assert _write(rows, 1) == generate_quotes_csv(_quotes(rows))
+
+
+def test_empty_export_has_only_headers():
+    assert _write([], 10) == generate_quotes_csv([])
@@ -0,0 +1,18 @@
+# PDF描画方式（platypus・canvas）の見た目の一致を確認するテスト
+#
+# 両方式で作成したPDFを PyMuPDF でラスタライズし、画素単位で比較する。
+# PyMuPDF は requirements-dev.txt に含まれる（ない場合はスキップせずエラーにする）。
+
+import pymupdf  # noqa: F401  比較に必須のため、ない場合は収集時にエラーにする
+import pytest
+
+from quote_samples import compare_quote_pdfs, engine_comparison_cases
+
+CASES = engine_comparison_cases()
+
+
+@pytest.mark.parametrize("label", list(CASES))
+def test_canvas_matches_platypus(label):
+    diffs = compare_quote_pdfs(CASES[label])
+    assert diffs is not None, "ページ数が一致しません"
+    assert not any(diffs), f"差分のある画素数（ページごと）: {diffs}"
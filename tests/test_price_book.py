@@ -0,0 +1,99 @@
+# 価格表（改定履歴と日付時点の価格の検索）と、マスタデータの改定履歴の検証のテスト
+
+from datetime import date
+
+import pytest
+
+import products
+from master_data import MasterDataError, build_master_data
+from price_book import NO_LOT, PriceBook
+
+JAN = "4589570801416"          # 香るトリュフ（118円）
+WATER_JAN = "4589570801485"    # 2Water
+
+
+def _book(entries, current_prices=None):
+    return PriceBook(entries, current_prices if current_prices is not None else {(JAN, NO_LOT): 118})
+
+
+def _master_dict(price_history):
+    return {"products": products.CATALOG.to_dicts(), "price_history": price_history}
+
+
+@pytest.mark.parametrize("on_date, expected", [
+    ("2024-01-01", 100),   # 最も古い改定より前は開始価格
+    ("2025-01-01", 100),   # 適用開始日の当日
+    ("2025-12-31", 100),
+    ("2026-04-01", 118),
+    ("2030-01-01", 118),   # 最新の改定より後
+])
+def test_price_as_of_revision_dates(on_date, expected):
+    book = _book([(JAN, NO_LOT, "2025-01-01", 100), (JAN, NO_LOT, "2026-04-01", 118)])
+    assert book.price_as_of(JAN, NO_LOT, on_date) == expected
+
+
+def test_price_as_of_accepts_date_and_datetime():
+    book = _book([(JAN, NO_LOT, date(2026, 4, 1), 118), (JAN, NO_LOT, date(2025, 1, 1), 100)])
+    assert book.price_as_of(JAN, NO_LOT, date(2026, 3, 31)) == 100
+    assert book.prices_as_of([(JAN, NO_LOT, "2026-04-01 09:30:00"), ("0000", NO_LOT, "2026-04-01")]) == [118, None]
+
+
+def test_key_without_revisions_uses_current_price():
+    book = _book([], {(JAN, NO_LOT): 118})
+    assert book.price_as_of(JAN, NO_LOT, "1990-01-01") == 118
+    assert book.history(JAN) == ()
+
+
+def test_water_prices_are_per_lot():
+    book = PriceBook.from_catalog(
+        products.CATALOG, products.WATER_LOT_PATTERNS,
+        [(WATER_JAN, "1ケース", "2025-01-01", 120), (WATER_JAN, "1ケース", "2026-04-01", 108)],
+    )
+    assert book.price_as_of(WATER_JAN, "1ケース", "2025-06-01") == 120
+    assert book.price_as_of(WATER_JAN, "1ケース", "2026-06-01") == 108
+    assert book.price_as_of(WATER_JAN, "10ケース", "2025-06-01") == 108
+    items = [
+        {"jan": WATER_JAN, "is_water": True, "order_lot": "1ケース"},
+        {"jan": JAN, "order_lot": "1ケース"},   # 2Water以外はロットを見ない
+    ]
+    assert book.standard_prices(items, "2025-06-01") == [120, 118]
+
+
+def test_latest_revision_must_match_current_price():
+    with pytest.raises(ValueError, match="一致しません"):
+        _book([(JAN, NO_LOT, "2025-01-01", 118), (JAN, NO_LOT, "2026-04-01", 128)])
+
+
+def test_revisions_of_discontinued_products_are_not_checked():
+    book = _book([("0000000000000", NO_LOT, "2025-01-01", 200)])
+    assert book.price_as_of("0000000000000", NO_LOT, "2024-01-01") == 200
+
+
+def test_duplicate_effective_dates_are_rejected():
+    with pytest.raises(ValueError, match="同じ適用開始日"):
+        _book([(JAN, NO_LOT, "2026-04-01", 100), (JAN, NO_LOT, "2026-04-01", 118)])
+
+
+def test_master_data_builds_price_book_from_history():
+    master = build_master_data(_master_dict([
+        {"jan": JAN, "effective_date": "2025-01-01", "wholesale_price": 100},
+        {"jan": JAN, "effective_date": "2026-04-01", "wholesale_price": 118},
+        {"jan": WATER_JAN, "lot": "10ケース", "effective_date": "2025-01-01", "wholesale_price": 108},
+    ]))
+    assert master.price_book.price_as_of(JAN, NO_LOT, "2026-03-31") == 100
+    assert master.price_book.history(JAN) == ((date(2025, 1, 1), 100), (date(2026, 4, 1), 118))
+    assert master.price_book.price_as_of(WATER_JAN, "10ケース", "2020-01-01") == 108
+
+
+@pytest.mark.parametrize("price_history, message", [
+    ({"jan": JAN}, "リストで指定"),
+    ([{"jan": JAN, "wholesale_price": 118}], "effective_date"),
+    ([{"jan": JAN, "effective_date": "2026/04/01", "wholesale_price": 118}], "YYYY-MM-DD"),
+    ([{"jan": WATER_JAN, "effective_date": "2026-04-01", "wholesale_price": 108}], "lot"),
+    ([{"jan": JAN, "effective_date": "2026-04-01", "wholesale_price": 128}], "一致しません"),
+    ([{"jan": JAN, "effective_date": "2026-04-01", "wholesale_price": 118},
+      {"jan": JAN, "effective_date": "2026-04-01", "wholesale_price": 118}], "同じ適用開始日"),
+])
+def test_master_data_rejects_invalid_price_history(price_history, message):
+    with pytest.raises(MasterDataError, match=message):
+        build_master_data(_master_dict(price_history))